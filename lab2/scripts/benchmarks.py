@@ -0,0 +1,134 @@
+from __future__ import print_function
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from scripts.classifiers.neural_net import TwoLayerNet
+
+
+def time_function(f, *args, **kwargs):
+    """
+    Call a function f with args and return the time (in seconds) that it took
+    to execute together with its result.
+    """
+    tic = time.time()
+    result = f(*args, **kwargs)
+    toc = time.time()
+    return toc - tic, result
+
+
+def temporary_memory(f, *args, **kwargs):
+    """
+    Call f and return the peak number of bytes it allocated on top of what
+    was already allocated, as seen by tracemalloc (NumPy reports its array
+    buffers to tracemalloc).
+    """
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        f(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_two_layer_net(hidden_sizes=(50, 100, 200, 500, 1000),
+                            batch_size=200, input_size=3072, num_classes=10,
+                            num_iters=50, seed=0):
+    """
+    Time per iteration and temporary memory of TwoLayerNet.loss against
+    TwoLayerNet.loss_fused for several hidden layer sizes.
+
+    Returns a dictionary mapping every hidden size to the seconds per call and
+    temporary bytes per warm call of both versions.
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(batch_size, input_size)
+    y = rng.randint(num_classes, size=batch_size)
+    results = {}
+    for hidden_size in hidden_sizes:
+        np.random.seed(seed)
+        net = TwoLayerNet(input_size, hidden_size, num_classes, std=1e-2)
+        net.loss_fused(X, y, reg=0.1)
+        results[hidden_size] = {}
+        for name, f in [('loss', lambda: net.loss(X, y, reg=0.1)),
+                         ('loss_fused', lambda: net.loss_fused(X, y, reg=0.1))]:
+            elapsed, _ = time_function(lambda: [f() for _ in range(num_iters)])
+            nbytes = temporary_memory(f)
+            results[hidden_size][name] = (elapsed / num_iters, nbytes)
+            print('H=%d %s: %f ms per call, %d temporary bytes per call'
+                  % (hidden_size, name, 1000 * elapsed / num_iters, nbytes))
+    return results
+
+
+def benchmark_float32_training(hidden_size=100, num_train=5000,
+                               input_size=3072, num_classes=10,
+                               num_iters=200, batch_size=200, seed=0):
+    """
+    Time TwoLayerNet.train with float64 parameters and data against float32
+    parameters and data, and check that float32 stays float32 in the
+    parameters, the loss and the gradients.
+
+    Returns a dictionary with the float64 and float32 seconds.
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(num_train, input_size)
+    y = rng.randint(num_classes, size=num_train)
+    times = {}
+    for dtype in [np.float64, np.float32]:
+        data = X.astype(dtype)
+        np.random.seed(seed)
+        net = TwoLayerNet(input_size, hidden_size, num_classes, std=1e-2,
+                          dtype=dtype)
+        elapsed, _ = time_function(net.train, data, y, data[:100], y[:100],
+                                   num_iters=num_iters, batch_size=batch_size,
+                                   fused=True)
+        loss, grads = net.loss_fused(data[:batch_size], y[:batch_size], reg=0.1)
+        assert np.asarray(loss).dtype == dtype
+        assert all(p.dtype == dtype for p in net.params.values())
+        assert all(g.dtype == dtype for g in grads.values())
+        times[np.dtype(dtype).name] = elapsed
+    print('TwoLayerNet float64: %fs, float32: %fs, speedup %.1fx'
+          % (times['float64'], times['float32'],
+             times['float64'] / times['float32']))
+    return times
+
+
+def benchmark_prefetch(hidden_size=100, num_train=5000, input_size=3072,
+                       num_classes=10, num_iters=200, batch_size=200,
+                       depths=(0, 1, 2, 4), seed=0):
+    """
+    Time TwoLayerNet.train with synchronous minibatch sampling (prefetch=0)
+    against the BatchPrefetcher with several queue depths, and check that
+    every depth trains to the same parameters under the same seed.
+
+    Returns a dictionary mapping every depth to its seconds.
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(num_train, input_size)
+    y = rng.randint(num_classes, size=num_train)
+    results = {}
+    reference = None
+    for depth in depths:
+        np.random.seed(seed)
+        net = TwoLayerNet(input_size, hidden_size, num_classes, std=1e-2)
+        elapsed, _ = time_function(net.train, X, y, X[:100], y[:100],
+                                   num_iters=num_iters, batch_size=batch_size,
+                                   prefetch=depth, fused=True)
+        if depth > 0:
+            if reference is None:
+                reference = net.params
+            same = all(np.array_equal(reference[k], net.params[k])
+                       for k in reference)
+            assert same, 'prefetch=%d is not deterministic' % depth
+        results[depth] = elapsed
+        print('prefetch=%d: %fs' % (depth, elapsed))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_two_layer_net()
+    benchmark_float32_training()
+    benchmark_prefetch()
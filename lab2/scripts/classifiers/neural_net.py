@@ -6,6 +6,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 from past.builtins import xrange
 
+from scripts.prefetch import BatchPrefetcher
+
 class TwoLayerNet(object):
     """
     A two-layer fully-connected neural network. The net has an input dimension of
@@ -21,7 +23,8 @@ class TwoLayerNet(object):
     The outputs of the second fully-connected layer are the scores for each class.
     """
 
-    def __init__(self, input_size, hidden_size, output_size, std=1e-4):
+    def __init__(self, input_size, hidden_size, output_size, std=1e-4,
+                 dtype=np.float64):
         """
         Initialize the model. Weights are initialized to small random values and
         biases are initialized to zero. Weights and biases are stored in the
@@ -36,14 +39,19 @@ class TwoLayerNet(object):
         - input_size: The dimension D of the input data.
         - hidden_size: The number of neurons H in the hidden layer.
         - output_size: The number of classes C.
+        - dtype: numpy datatype of the parameters and of the computation;
+          training data is cast to it one minibatch at a time.
         """
+        self.dtype = dtype
         self.params = {}
-        self.params['W1'] = std * np.random.randn(input_size, hidden_size)
-        self.params['b1'] = np.zeros(hidden_size)
-        self.params['W2'] = std * np.random.randn(hidden_size, output_size)
-        self.params['b2'] = np.zeros(output_size)
-
-    def loss(self, X, y=None, reg=0.0):
+        self.params['W1'] = (std * np.random.randn(input_size, hidden_size)).astype(dtype)
+        self.params['b1'] = np.zeros(hidden_size, dtype=dtype)
+        self.params['W2'] = (std * np.random.randn(hidden_size, output_size)).astype(dtype)
+        self.params['b2'] = np.zeros(output_size, dtype=dtype)
+        # Scratch buffers of loss_fused, rebuilt when the batch shape changes.
+        self.loss_cache = {}
+
+    def loss(self, X, y=None, reg=0.0, fused=False):
         """
         Compute the loss and gradients for a two layer fully connected neural
         network.
@@ -55,6 +63,8 @@ class TwoLayerNet(object):
           is not passed then we only return scores, and if it is passed then we
           instead return the loss and gradients.
         - reg: Regularization strength.
+        - fused: If True, delegate to loss_fused. It gives the same results but
+          returns gradients in scratch buffers that the next call overwrites.
 
         Returns:
         If y is None, return a matrix scores of shape (N, C) where scores[i, c] is
@@ -66,6 +76,9 @@ class TwoLayerNet(object):
         - grads: Dictionary mapping parameter names to gradients of those parameters
           with respect to the loss function; has the same keys as self.params.
         """
+        if fused:
+            return self.loss_fused(X, y=y, reg=reg)
+
         # Unpack variables from the params dictionary
         W1, b1 = self.params['W1'], self.params['b1']
         W2, b2 = self.params['W2'], self.params['b2']
@@ -104,7 +117,7 @@ class TwoLayerNet(object):
         #############################################################################
         # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-        exp_scores = np.exp(scores)
+        exp_scores = np.exp(scores - np.max(scores, axis=1, keepdims=True))
         a2 = exp_scores / np.sum(exp_scores, axis=1, keepdims=True)
         cor_log_probs = -np.log(a2[range(N), y])
         data_loss = np.sum(cor_log_probs) / N
@@ -138,10 +151,100 @@ class TwoLayerNet(object):
 
         return loss, grads
 
+    def loss_fused(self, X, y=None, reg=0.0):
+        """
+        Compute the same loss and gradients as loss, reusing scratch buffers
+        between calls.
+
+        The activations, ReLU mask, scores and every gradient live in buffers
+        in self.loss_cache that are kept as long as the batch shape and dtype
+        stay the same. ReLU and its mask are applied in place, and the softmax
+        uses the log-sum-exp of scores shifted by their row maximum, so large
+        scores do not overflow. The returned gradients are those buffers and
+        are overwritten by the next call.
+
+        Inputs and outputs are the same as for loss.
+        """
+        W1, b1 = self.params['W1'], self.params['b1']
+        W2, b2 = self.params['W2'], self.params['b2']
+        N, D = X.shape
+        H, C = W2.shape
+        dtype = np.result_type(X, W1, W2)
+        cache = self.loss_cache
+        key = (N, D, H, C, dtype)
+        if cache.get('key') != key:
+            cache.clear()
+            cache['key'] = key
+            cache['hidden'] = np.empty((N, H), dtype=dtype)
+            cache['mask'] = np.empty((N, H), dtype=bool)
+            cache['scores'] = np.empty((N, C), dtype=dtype)
+            cache['row_max'] = np.empty(N, dtype=dtype)
+            cache['row_sum'] = np.empty(N, dtype=dtype)
+            cache['losses'] = np.empty(N, dtype=dtype)
+            cache['flat_y'] = np.empty(N, dtype=np.intp)
+            cache['row_offsets'] = np.arange(N) * C
+            cache['grads'] = {k: np.empty(v.shape, dtype=dtype)
+                              for k, v in self.params.items()}
+            cache['reg_grads'] = {k: np.empty(self.params[k].shape, dtype=dtype)
+                                  for k in ('W1', 'W2')}
+        hidden = cache['hidden']
+        mask = cache['mask']
+        scores = cache['scores']
+        row_max = cache['row_max']
+        row_sum = cache['row_sum']
+        losses = cache['losses']
+        flat_y = cache['flat_y']
+        grads = cache['grads']
+        reg_grads = cache['reg_grads']
+
+        # Forward pass: affine - ReLU (in place) - affine.
+        np.dot(X, W1, out=hidden)
+        hidden += b1
+        np.greater(hidden, 0, out=mask)
+        hidden *= mask
+        np.dot(hidden, W2, out=scores)
+        scores += b2
+
+        if y is None:
+            return scores.copy()
+
+        # Softmax loss via log-sum-exp of the shifted scores.
+        np.add(cache['row_offsets'], y, out=flat_y)
+        np.max(scores, axis=1, out=row_max)
+        scores -= row_max[:, np.newaxis]
+        np.take(scores, flat_y, out=losses)
+        np.exp(scores, out=scores)
+        np.sum(scores, axis=1, out=row_sum)
+        np.subtract(np.log(row_sum, out=row_max), losses, out=losses)
+        data_loss = np.sum(losses) / N
+        reg_loss = 0.5 * reg * (np.vdot(W1, W1) + np.vdot(W2, W2))
+        loss = data_loss + reg_loss
+
+        # Backward pass; scores turns into dscores in place.
+        scores /= row_sum[:, np.newaxis]
+        np.take(scores, flat_y, out=row_sum)
+        row_sum -= 1
+        np.put(scores, flat_y, row_sum)
+        scores *= 1.0 / N
+        np.dot(hidden.T, scores, out=grads['W2'])
+        np.sum(scores, axis=0, out=grads['b2'])
+        # The hidden activations are no longer needed: reuse them for dhidden.
+        dhidden = hidden
+        np.dot(scores, W2.T, out=dhidden)
+        dhidden *= mask
+        np.dot(X.T, dhidden, out=grads['W1'])
+        np.sum(dhidden, axis=0, out=grads['b1'])
+        for k in ('W1', 'W2'):
+            np.multiply(self.params[k], reg, out=reg_grads[k])
+            grads[k] += reg_grads[k]
+
+        return loss, grads
+
     def train(self, X, y, X_val, y_val,
               learning_rate=1e-3, learning_rate_decay=0.95,
               reg=5e-6, num_iters=100,
-              batch_size=200, verbose=False):
+              batch_size=200, verbose=False, early_stopping=None,
+              prefetch=0, fused=False):
         """
         Train this neural network using stochastic gradient descent.
 
@@ -158,6 +261,16 @@ class TwoLayerNet(object):
         - num_iters: Number of steps to take when optimizing.
         - batch_size: Number of training examples to use per step.
         - verbose: boolean; if true print progress during optimization.
+        - early_stopping: An optional EarlyStopping monitor. Training stops
+          once it reports convergence, and the parameters of its best check
+          are restored at the end. With metric='val_acc' it is scored on
+          X_val and y_val.
+        - prefetch: If positive, sample minibatches with a BatchPrefetcher
+          that prepares up to this many batches in a background thread.
+          The batches are deterministic under np.random.seed, but they are
+          a different sample than with prefetch=0.
+        - fused: If True, compute every step with loss(..., fused=True), which
+          reuses its buffers between iterations instead of allocating new ones.
         """
         num_train = X.shape[0]
         iterations_per_epoch = max(num_train / batch_size, 1)
@@ -166,6 +279,12 @@ class TwoLayerNet(object):
         loss_history = []
         train_acc_history = []
         val_acc_history = []
+        if early_stopping is not None:
+            early_stopping.reset()
+        loader = None
+        if prefetch > 0:
+            loader = BatchPrefetcher(X, y, batch_size, num_prefetch=prefetch,
+                                     dtype=self.dtype)
 
         for it in range(num_iters):
             X_batch = None
@@ -177,14 +296,22 @@ class TwoLayerNet(object):
             #########################################################################
             # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-            sample_indices = np.random.choice(num_train, batch_size)
-            X_batch = X[sample_indices]
-            y_batch = y[sample_indices]
+            if loader is not None:
+                X_batch, y_batch = loader.next_batch()
+            else:
+                sample_indices = np.random.choice(num_train, batch_size)
+                X_batch = X[sample_indices]
+                y_batch = y[sample_indices]
 
             # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
             # Compute loss and gradients using the current minibatch
-            loss, grads = self.loss(X_batch, y=y_batch, reg=reg)
+            # Keep the loss in the parameters' precision; a no-op if X matches.
+            X_batch = X_batch.astype(self.dtype, copy=False)
+            if fused:
+                loss, grads = self.loss(X_batch, y=y_batch, reg=reg, fused=True)
+            else:
+                loss, grads = self.loss(X_batch, y=y_batch, reg=reg)
             loss_history.append(loss)
 
             #########################################################################
@@ -216,6 +343,23 @@ class TwoLayerNet(object):
                 # Decay learning rate
                 learning_rate *= learning_rate_decay
 
+            if early_stopping is not None:
+                early_stopping.add_loss(loss)
+                if early_stopping.should_check(it):
+                    val_acc = None
+                    if early_stopping.metric == 'val_acc':
+                        val_acc = (self.predict(X_val) == y_val).mean()
+                    if early_stopping.update(it, self.params, val_acc=val_acc):
+                        if verbose:
+                            print('converged at iteration %d / %d'
+                                  % (it, num_iters))
+                        break
+
+        if loader is not None:
+            loader.close()
+        if early_stopping is not None and early_stopping.best_params is not None:
+            self.params = early_stopping.best_params
+
         return {
           'loss_history': loss_history,
           'train_acc_history': train_acc_history,
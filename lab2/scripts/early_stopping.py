@@ -0,0 +1,96 @@
+from builtins import object
+
+import numpy as np
+
+
+class EarlyStopping(object):
+    """
+    Convergence monitor for the SGD loops in the train() methods.
+
+    Every check_every iterations train() reports a score to update(): either
+    an exponential moving average of the minibatch loss (metric='loss') or
+    the validation accuracy (metric='val_acc'). When the score has not
+    improved by more than min_delta for patience checks in a row, update()
+    returns True and training stops. The parameters seen at the best check
+    are kept so that train() can restore them at the end.
+
+    Example usage:
+
+    monitor = EarlyStopping(metric='loss', check_every=50, patience=5)
+    loss_history = svm.train(X, y, num_iters=5000, early_stopping=monitor)
+    print('stopped at iteration %d' % monitor.stopped_iter)
+    """
+
+    def __init__(self, metric='loss', check_every=50, patience=5,
+                 min_delta=1e-3, smoothing=0.9):
+        """
+        Inputs:
+        - metric: 'loss' to watch the smoothed training loss or 'val_acc' to
+          watch the validation accuracy.
+        - check_every: Number of iterations between two checks.
+        - patience: Number of checks without improvement before stopping.
+        - min_delta: Smallest change of the score that counts as improvement.
+        - smoothing: Decay of the moving average of the loss.
+        """
+        if metric not in ('loss', 'val_acc'):
+            raise ValueError('Invalid metric "%s"' % metric)
+        self.metric = metric
+        self.check_every = check_every
+        self.patience = patience
+        self.min_delta = min_delta
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        """Forget everything seen so far; train() calls this on entry."""
+        self.smoothed_loss = None
+        self.best_score = None
+        self.best_params = None
+        self.best_iter = None
+        self.stopped_iter = None
+        self.num_bad_checks = 0
+
+    def add_loss(self, loss):
+        """Fold the loss of one iteration into the moving average."""
+        if self.smoothed_loss is None:
+            self.smoothed_loss = loss
+        else:
+            self.smoothed_loss = (self.smoothing * self.smoothed_loss
+                                  + (1 - self.smoothing) * loss)
+
+    def should_check(self, it):
+        """Whether iteration it (counting from 0) is a check."""
+        return (it + 1) % self.check_every == 0
+
+    def update(self, it, params, val_acc=None):
+        """
+        Record a check and decide whether to stop.
+
+        Inputs:
+        - it: The current iteration.
+        - params: The current parameters; an array or a dictionary of arrays.
+          They are copied if they are the best so far.
+        - val_acc: The validation accuracy; required for metric='val_acc'.
+
+        Returns True if training should stop.
+        """
+        if self.metric == 'loss':
+            score = -self.smoothed_loss
+        else:
+            score = val_acc
+
+        if self.best_score is None or score > self.best_score + self.min_delta:
+            self.best_score = score
+            self.best_iter = it
+            self.num_bad_checks = 0
+            if isinstance(params, dict):
+                self.best_params = {k: v.copy() for k, v in params.items()}
+            else:
+                self.best_params = np.copy(params)
+        else:
+            self.num_bad_checks += 1
+
+        if self.num_bad_checks >= self.patience:
+            self.stopped_iter = it
+            return True
+        return False
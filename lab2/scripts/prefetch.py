@@ -0,0 +1,100 @@
+from builtins import object
+import queue
+import threading
+
+import numpy as np
+
+
+class BatchPrefetcher(object):
+    """
+    Samples random minibatches in a background thread.
+
+    A worker thread draws the indices of each minibatch, gathers the rows of
+    X and y and optionally casts them. It puts the results on a bounded
+    queue, so up to num_prefetch batches are prepared while the caller
+    computes on the current one. The queue bounds the extra memory to
+    num_prefetch minibatches.
+
+    All indices come from a private RandomState, drawn in order by the single
+    worker thread. The sequence of batches therefore depends only on the seed
+    and not on timing or on num_prefetch.
+
+    Example usage:
+
+    loader = BatchPrefetcher(X, y, batch_size=200, num_prefetch=2)
+    for it in range(num_iters):
+        X_batch, y_batch = loader.next_batch()
+        ...
+    loader.close()
+    """
+
+    def __init__(self, X, y, batch_size, num_prefetch=2, dtype=None,
+                 seed=None):
+        """
+        Inputs:
+        - X: Array of shape (N, ...) of training data.
+        - y: Array of shape (N,) of training labels.
+        - batch_size: Number of examples per minibatch; they are sampled with
+          replacement, as with np.random.choice.
+        - num_prefetch: Maximum number of batches prepared ahead of time.
+        - dtype: If given, X_batch is cast to this datatype in the worker.
+        - seed: Seed of the index stream. If None, it is drawn from the global
+          np.random state, so np.random.seed still makes training repeatable.
+        """
+        if num_prefetch < 1:
+            raise ValueError('Invalid num_prefetch "%s"' % num_prefetch)
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+        self.dtype = dtype
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(seed)
+        self._queue = queue.Queue(maxsize=num_prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def next_batch(self):
+        """
+        Return the next minibatch as a tuple (X_batch, y_batch) of freshly
+        allocated arrays. An error raised in the worker is raised here.
+        """
+        item = self._queue.get()
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def close(self):
+        """Stop the worker thread and drop the batches it prepared."""
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(0.01)
+
+    def _run(self):
+        num_train = self.X.shape[0]
+        try:
+            while not self._stop.is_set():
+                sample_indices = self.rng.choice(num_train, self.batch_size)
+                X_batch = np.take(self.X, sample_indices, axis=0)
+                y_batch = np.take(self.y, sample_indices)
+                if self.dtype is not None:
+                    X_batch = X_batch.astype(self.dtype, copy=False)
+                self._put((X_batch, y_batch))
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        # Wake up regularly so that close() can stop a worker blocked on a
+        # full queue.
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
@@ -0,0 +1,636 @@
+from __future__ import print_function
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from imageio import imwrite
+
+from scripts.data_utils import (
+    get_CIFAR10_data,
+    load_tiny_imagenet,
+    load_tiny_imagenet_parallel,
+    stream_tiny_imagenet,
+)
+from scripts.im2col import col2im_6d_numpy, col2im_numpy, im2col_numpy
+from scripts.layers import (
+    conv_backward_naive,
+    conv_backward_vectorized,
+    conv_forward_naive,
+    conv_forward_vectorized,
+)
+from scripts.solver import Solver
+
+
+def time_function(f, *args, **kwargs):
+    """
+    Call a function f with args and return the time (in seconds) that it took
+    to execute together with its result.
+    """
+    tic = time.time()
+    result = f(*args, **kwargs)
+    toc = time.time()
+    return toc - tic, result
+
+
+def temporary_memory(f, *args, **kwargs):
+    """
+    Call f and return the peak number of bytes it allocated on top of what
+    was already allocated, as seen by tracemalloc (NumPy reports its array
+    buffers to tracemalloc).
+    """
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        f(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def write_fake_CIFAR10(root, seed=0):
+    """
+    Write random images in the format of cifar-10-batches-py to root, so that
+    the loaders can be benchmarked without downloading CIFAR-10.
+    """
+    rng = np.random.RandomState(seed)
+    names = ["data_batch_%d" % b for b in range(1, 6)] + ["test_batch"]
+    for name in names:
+        batch = {
+            "data": rng.randint(256, size=(10000, 3072)).astype(np.uint8),
+            "labels": list(rng.randint(10, size=10000)),
+        }
+        with open(os.path.join(root, name), "wb") as f:
+            pickle.dump(batch, f, protocol=2)
+
+
+class _LinearModel(object):
+    """A linear softmax scorer with the model API expected by Solver."""
+
+    def __init__(self, input_dim, num_classes, seed=0):
+        rng = np.random.RandomState(seed)
+        self.params = {"W": 1e-4 * rng.randn(input_dim, num_classes)}
+
+    def loss(self, X, y=None):
+        X = X.reshape(X.shape[0], -1)
+        scores = X.dot(self.params["W"])
+        if y is None:
+            return scores
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=1, keepdims=True)
+        loss = -np.mean(np.log(probs[np.arange(len(y)), y]))
+        probs[np.arange(len(y)), y] -= 1
+        return loss, {"W": X.T.dot(probs) / len(y)}
+
+
+def benchmark_lazy_cifar10(cifar10_dir=None, num_epochs=1, batch_size=200, seed=0):
+    """
+    Compare get_CIFAR10_data with get_CIFAR10_data(lazy=True): time and
+    memory allocated to load the data, and the time of one Solver run on
+    each with a linear model. Checks that both give the same images and the
+    same training history.
+
+    If cifar10_dir is None random images in the CIFAR-10 format are written
+    to a temporary directory, which also holds the uint8 cache.
+
+    Returns a dictionary mapping "eager" and "lazy" to their load seconds,
+    allocated bytes and Solver seconds.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if cifar10_dir is None:
+            cifar10_dir = os.path.join(tmp_dir, "cifar-10-batches-py")
+            os.makedirs(cifar10_dir)
+            write_fake_CIFAR10(cifar10_dir, seed=seed)
+        # Build the cache outside of the measurements.
+        get_CIFAR10_data(lazy=True, cifar10_dir=cifar10_dir)
+
+        results = {}
+        datasets = {}
+        for name, lazy in [("eager", False), ("lazy", True)]:
+            load = lambda: get_CIFAR10_data(lazy=lazy, cifar10_dir=cifar10_dir)
+            nbytes = temporary_memory(load)
+            load_time, datasets[name] = time_function(load)
+
+            data = datasets[name]
+            model = _LinearModel(3 * 32 * 32, 10, seed=seed)
+            solver = Solver(
+                model,
+                data,
+                optim_config={"learning_rate": 1e-6},
+                num_epochs=num_epochs,
+                batch_size=batch_size,
+                verbose=False,
+            )
+            np.random.seed(seed)
+            train_time, _ = time_function(solver.train)
+            results[name] = {
+                "load_time": load_time,
+                "nbytes": nbytes,
+                "train_time": train_time,
+                "val_acc_history": solver.val_acc_history,
+            }
+            print(
+                "%s: load %fs, %.1f MB allocated, Solver %fs"
+                % (name, load_time, nbytes / 2.0 ** 20, train_time)
+            )
+
+        idx = np.random.RandomState(seed).choice(49000, batch_size)
+        eager, lazy = datasets["eager"], datasets["lazy"]
+        assert np.allclose(eager["X_train"][idx], lazy["X_train"][idx])
+        assert np.allclose(eager["X_test"][:batch_size], lazy["X_test"][:batch_size])
+        assert np.allclose(
+            results["eager"]["val_acc_history"], results["lazy"]["val_acc_history"]
+        )
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def write_fake_tiny_imagenet(
+    root, num_classes=10, num_train=100, num_val=50, num_test=50, seed=0
+):
+    """
+    Write random 64x64 PNG images in the directory layout of TinyImageNet to
+    root, with num_train training images per class. Every tenth image is
+    grayscale, as some TinyImageNet images are.
+    """
+    rng = np.random.RandomState(seed)
+    count = [0]
+
+    def write_image(filename):
+        shape = (64, 64) if count[0] % 10 == 0 else (64, 64, 3)
+        imwrite(filename, rng.randint(256, size=shape).astype(np.uint8))
+        count[0] += 1
+
+    wnids = ["n%08d" % i for i in range(num_classes)]
+    with open(os.path.join(root, "wnids.txt"), "w") as f:
+        f.write("".join("%s\n" % wnid for wnid in wnids))
+    with open(os.path.join(root, "words.txt"), "w") as f:
+        for i, wnid in enumerate(wnids):
+            f.write("%s\tclass %d, thing %d\n" % (wnid, i, i))
+    for wnid in wnids:
+        os.makedirs(os.path.join(root, "train", wnid, "images"))
+        with open(os.path.join(root, "train", wnid, "%s_boxes.txt" % wnid), "w") as f:
+            for j in range(num_train):
+                img_file = "%s_%d.png" % (wnid, j)
+                write_image(os.path.join(root, "train", wnid, "images", img_file))
+                f.write("%s\t0\t0\t63\t63\n" % img_file)
+    for split, num_images in [("val", num_val), ("test", num_test)]:
+        os.makedirs(os.path.join(root, split, "images"))
+        with open(os.path.join(root, split, "%s_annotations.txt" % split), "w") as f:
+            for j in range(num_images):
+                img_file = "%s_%d.png" % (split, j)
+                write_image(os.path.join(root, split, "images", img_file))
+                f.write("%s\t%s\t0\t0\t63\t63\n" % (img_file, rng.choice(wnids)))
+
+
+def benchmark_tiny_imagenet(path=None, workers=(1, 2, 4), seed=0):
+    """
+    Time load_tiny_imagenet against load_tiny_imagenet_parallel with a cold
+    cache for several numbers of workers, and with a warm cache, and check
+    that all of them return the same data.
+
+    If path is None a small fake TinyImageNet is written to a temporary
+    directory. The caches are always written to a temporary directory. The
+    cold speedup of several workers is bounded by the number of cores, which
+    is printed with the results; the warm cache helps on any machine.
+
+    Returns a dictionary mapping every variant to its seconds.
+    """
+    print("%d cores available" % (os.cpu_count() or 1))
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if path is None:
+            path = os.path.join(tmp_dir, "tiny-imagenet")
+            os.makedirs(path)
+            write_fake_tiny_imagenet(path, seed=seed)
+
+        results = {}
+        results["serial"], reference = time_function(load_tiny_imagenet, path)
+        print("load_tiny_imagenet: %fs" % results["serial"])
+        variants = [("cold, %d workers" % n, n) for n in workers]
+        variants.append(("warm", workers[-1]))
+        for name, n_jobs in variants:
+            cache_dir = os.path.join(tmp_dir, "cache-%d" % n_jobs)
+            results[name], data = time_function(
+                load_tiny_imagenet_parallel, path, n_jobs=n_jobs, cache_dir=cache_dir
+            )
+            print(
+                "load_tiny_imagenet_parallel, %s: %fs, speedup %.1fx"
+                % (name, results[name], results["serial"] / results[name])
+            )
+            for key, value in reference.items():
+                if isinstance(value, np.ndarray):
+                    assert np.array_equal(value, data[key]), key
+                else:
+                    assert value == data[key], key
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def benchmark_tiny_imagenet_stream(
+    path=None, batch_size=100, shuffle_buffer=200, num_epochs=2, seed=0
+):
+    """
+    Compare a Solver run on load_tiny_imagenet with one on
+    stream_tiny_imagenet: the time until the first minibatch is available,
+    the peak memory allocated and the total time.
+
+    If path is None a small fake TinyImageNet is written to a temporary
+    directory.
+
+    Returns a dictionary mapping "load" and "stream" to their seconds to the
+    first batch, allocated bytes and total seconds.
+    """
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if path is None:
+            path = os.path.join(tmp_dir, "tiny-imagenet")
+            os.makedirs(path)
+            write_fake_tiny_imagenet(path, num_train=300, seed=seed)
+
+        def make_stream():
+            return stream_tiny_imagenet(
+                path, batch_size=batch_size, shuffle_buffer=shuffle_buffer, seed=seed
+            )
+
+        def train(streamed):
+            if streamed:
+                data = _load_tiny_imagenet_val(path)
+                data["train_batches"] = make_stream()
+                num_classes = data["train_batches"].num_classes
+            else:
+                data = load_tiny_imagenet(path, subtract_mean=False)
+                num_classes = len(data["class_names"])
+            model = _LinearModel(3 * 64 * 64, num_classes, seed=seed)
+            solver = Solver(
+                model,
+                data,
+                optim_config={"learning_rate": 1e-7},
+                num_epochs=num_epochs,
+                batch_size=batch_size,
+                verbose=False,
+            )
+            solver.train()
+
+        results = {}
+        for name, first, streamed in [
+            ("load", lambda: load_tiny_imagenet(path), False),
+            ("stream", lambda: next(iter(make_stream())), True),
+        ]:
+            first_time, _ = time_function(first)
+            nbytes = temporary_memory(train, streamed)
+            np.random.seed(seed)
+            total_time, _ = time_function(train, streamed)
+            results[name] = (first_time, nbytes, total_time)
+            print(
+                "%s: first batch after %fs, %.1f MB allocated, Solver %fs"
+                % (name, first_time, nbytes / 2.0 ** 20, total_time)
+            )
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _load_tiny_imagenet_val(path):
+    """Only the validation split of TinyImageNet, as float32 arrays."""
+    stream = stream_tiny_imagenet(path, split="val", batch_size=1000)
+    batches = list(stream)
+    return {
+        "X_val": np.concatenate([X for X, _ in batches]),
+        "y_val": np.concatenate([y for _, y in batches]),
+    }
+
+
+def benchmark_conv_layers(
+    shapes=((50, 3, 32, 32, 25, 3, 1, 1), (20, 16, 16, 16, 32, 5, 2, 2)), seed=0
+):
+    """
+    Time the forward and backward passes of conv_forward_naive,
+    conv_forward_vectorized and, if it can be imported, conv_forward_fast on
+    a few layer shapes, and report the largest difference to the naive
+    results.
+
+    Every shape is a tuple (N, C, H, W, F, HH, stride, pad) with square
+    filters of size HH.
+
+    Returns a dictionary mapping every shape to the forward and backward
+    seconds of each implementation.
+    """
+    implementations = [
+        ("naive", conv_forward_naive, conv_backward_naive),
+        ("vectorized", conv_forward_vectorized, conv_backward_vectorized),
+    ]
+    try:
+        from scripts.fast_layers import conv_backward_fast, conv_forward_fast
+    except ImportError as e:
+        print("skipping conv_forward_fast: %s" % e)
+    else:
+        implementations.append(("fast", conv_forward_fast, conv_backward_fast))
+
+    rng = np.random.RandomState(seed)
+    results = {}
+    for shape in shapes:
+        N, C, H, W, F, HH, stride, pad = shape
+        x = rng.randn(N, C, H, W)
+        w = rng.randn(F, C, HH, HH)
+        b = rng.randn(F)
+        conv_param = {"stride": stride, "pad": pad}
+        results[shape] = {}
+        reference = None
+        for name, forward, backward in implementations:
+            forward_time, (out, cache) = time_function(forward, x, w, b, conv_param)
+            if reference is None:
+                dout = rng.randn(*out.shape)
+            backward_time, grads = time_function(backward, dout, cache)
+            if reference is None:
+                reference = (out,) + tuple(grads)
+            diff = max(
+                np.max(np.abs(a - r)) for a, r in zip((out,) + tuple(grads), reference)
+            )
+            results[shape][name] = (forward_time, backward_time)
+            print(
+                "%s %s: forward %fs, backward %fs, max difference %e"
+                % (shape, name, forward_time, backward_time, diff)
+            )
+    return results
+
+
+def _time_repeated(f, args, num_iters):
+    """
+    Call f(*args) num_iters times and return the seconds per call together
+    with the last result; earlier results are dropped as soon as possible.
+    """
+    tic = time.time()
+    for _ in range(num_iters):
+        result = None
+        result = f(*args)
+    toc = time.time()
+    return (toc - tic) / num_iters, result
+
+
+def benchmark_im2col(
+    shapes=(
+        (50, 3, 32, 32, 3, 1, 1),
+        (100, 32, 16, 16, 3, 1, 1),
+        (20, 16, 16, 16, 5, 2, 2),
+    ),
+    num_iters=10,
+    seed=0,
+):
+    """
+    Time the NumPy im2col_numpy, col2im_numpy and col2im_6d_numpy against the
+    compiled im2col_cython kernels, if the extension is built, and check that
+    they agree.
+
+    Every shape is a tuple (N, C, H, W, field size, stride, pad).
+
+    Returns a dictionary mapping every shape to the seconds per call of each
+    kernel, as (numpy, cython) pairs; cython is None without the extension.
+    """
+    try:
+        from scripts import im2col_cython
+    except ImportError:
+        im2col_cython = None
+        print("im2col_cython is not built; timing the NumPy kernels only")
+
+    rng = np.random.RandomState(seed)
+    results = {}
+    for shape in shapes:
+        N, C, H, W, field, stride, pad = shape
+        out_h = (H + 2 * pad - field) // stride + 1
+        out_w = (W + 2 * pad - field) // stride + 1
+        x = rng.randn(N, C, H, W)
+        cols = rng.randn(C * field * field, N * out_h * out_w)
+        cols_6d = rng.randn(C, field, field, N, out_h, out_w)
+        kernels = [
+            ("im2col", "im2col_numpy", (x, field, field, pad, stride)),
+            ("col2im", "col2im_numpy", (cols, N, C, H, W, field, field, pad, stride)),
+            (
+                "col2im_6d",
+                "col2im_6d_numpy",
+                (cols_6d, N, C, H, W, field, field, pad, stride),
+            ),
+        ]
+        results[shape] = {}
+        for name, numpy_name, args in kernels:
+            numpy_kernel = globals()[numpy_name]
+            numpy_time, expected = _time_repeated(numpy_kernel, args, num_iters)
+            cython_time = None
+            if im2col_cython is not None:
+                cython_kernel = getattr(im2col_cython, name + "_cython")
+                cython_time, actual = _time_repeated(cython_kernel, args, num_iters)
+                assert np.allclose(expected, actual)
+                print(
+                    "%s %s: numpy %fs, cython %fs, ratio %.2f"
+                    % (shape, name, numpy_time, cython_time, numpy_time / cython_time)
+                )
+            else:
+                print("%s %s: numpy %fs" % (shape, name, numpy_time))
+            results[shape][name] = (numpy_time, cython_time)
+    return results
+
+
+def benchmark_im2col_threads(
+    batch_sizes=(10, 50, 100),
+    threads=(1, 2, 4),
+    layer=(16, 32, 32, 3, 1, 1),
+    num_iters=10,
+    seed=0,
+):
+    """
+    Time the serial im2col_cython, col2im_cython and col2im_6d_cython against
+    their multithreaded *_parallel versions for several batch sizes and
+    numbers of threads, and check that both give the same results.
+
+    The layer is a tuple (C, H, W, field size, stride, pad).
+
+    Returns a dictionary mapping every batch size to the seconds per call of
+    each kernel: the serial time under "serial" and the parallel time under
+    every number of threads. Returns None if the extension is not built.
+    """
+    try:
+        from scripts import im2col_cython
+    except ImportError:
+        print("im2col_cython is not built; skipping the threaded kernels")
+        return None
+
+    C, H, W, field, stride, pad = layer
+    out_h = (H + 2 * pad - field) // stride + 1
+    out_w = (W + 2 * pad - field) // stride + 1
+    old_num_threads = im2col_cython.get_num_threads()
+    rng = np.random.RandomState(seed)
+    results = {}
+    try:
+        for N in batch_sizes:
+            x = rng.randn(N, C, H, W)
+            cols = rng.randn(C * field * field, N * out_h * out_w)
+            cols_6d = rng.randn(C, field, field, N, out_h, out_w)
+            kernels = [
+                ("im2col", (x, field, field, pad, stride)),
+                ("col2im", (cols, N, C, H, W, field, field, pad, stride)),
+                ("col2im_6d", (cols_6d, N, C, H, W, field, field, pad, stride)),
+            ]
+            results[N] = {}
+            for name, args in kernels:
+                serial = getattr(im2col_cython, name + "_cython")
+                parallel = getattr(im2col_cython, name + "_cython_parallel")
+                serial_time, expected = _time_repeated(serial, args, num_iters)
+                times = {"serial": serial_time}
+                line = "N=%d %s: serial %fs" % (N, name, serial_time)
+                for num_threads in threads:
+                    im2col_cython.set_num_threads(num_threads)
+                    elapsed, actual = _time_repeated(parallel, args, num_iters)
+                    assert np.array_equal(expected, actual)
+                    times[num_threads] = elapsed
+                    line += ", %d threads %fs" % (num_threads, elapsed)
+                results[N][name] = times
+                print(line)
+    finally:
+        im2col_cython.set_num_threads(old_num_threads)
+    return results
+
+
+def benchmark_conv_algorithms(
+    shapes=(
+        (50, 3, 32, 32, 32, 7, 1, 3),
+        (50, 3, 32, 32, 32, 3, 1, 1),
+        (50, 64, 16, 16, 64, 3, 1, 1),
+        (32, 256, 8, 8, 256, 3, 1, 1),
+        (50, 16, 32, 32, 16, 5, 1, 2),
+        (20, 16, 32, 32, 16, 11, 1, 5),
+    ),
+    num_iters=3,
+    seed=0,
+):
+    """
+    Time the forward plus backward pass of every algorithm in
+    fast_layers.CONV_ALGORITHMS that supports a shape, check them against the
+    strides algorithm, and report which one choose_conv_algorithm picks.
+
+    Every shape is a tuple (N, C, H, W, F, HH, stride, pad) with square
+    filters of size HH.
+
+    Returns a dictionary mapping every shape to the seconds per forward and
+    backward pass of each algorithm.
+    """
+    from scripts.fast_layers import (
+        CONV_ALGORITHMS,
+        choose_conv_algorithm,
+        conv_algorithm_supported,
+    )
+
+    def forward_backward(forward, backward, x, w, b, conv_param, dout):
+        out, cache = forward(x, w, b, conv_param)
+        return (out,) + tuple(backward(dout, cache))
+
+    rng = np.random.RandomState(seed)
+    results = {}
+    for shape in shapes:
+        N, C, H, W, F, HH, stride, pad = shape
+        x = rng.randn(N, C, H, W)
+        w = rng.randn(F, C, HH, HH)
+        b = rng.randn(F)
+        conv_param = {"stride": stride, "pad": pad}
+        out_h = (H + 2 * pad - HH) // stride + 1
+        out_w = (W + 2 * pad - HH) // stride + 1
+        dout = rng.randn(N, F, out_h, out_w)
+        args = (x, w, b, conv_param, dout)
+        reference = None
+        results[shape] = {}
+        for name, (forward, backward) in CONV_ALGORITHMS.items():
+            if not conv_algorithm_supported(name, x.shape, w.shape, conv_param):
+                continue
+            elapsed, grads = _time_repeated(
+                forward_backward, (forward, backward) + args, num_iters
+            )
+            if reference is None:
+                reference = grads
+            diff = max(np.max(np.abs(g - r)) for g, r in zip(grads, reference))
+            results[shape][name] = elapsed
+            print("%s %s: %fs, max difference %e" % (shape, name, elapsed, diff))
+        fastest = min(results[shape], key=results[shape].get)
+        chosen = choose_conv_algorithm(x.shape, w.shape, conv_param)
+        print("%s fastest: %s, chosen: %s" % (shape, fastest, chosen))
+    return results
+
+
+def benchmark_conv_autotune(
+    shapes=(
+        (50, 3, 32, 32, 32, 7, 1, 3),
+        (50, 32, 16, 16, 32, 3, 1, 1),
+        (50, 16, 32, 32, 16, 5, 1, 2),
+    ),
+    num_iters=5,
+    seed=0,
+):
+    """
+    Measure the cost of ConvAutotuner: the time spent tuning the first call
+    of every shape, the time of a lookup once the shape is known, and the
+    time per call of the tuned forward pass against a direct call of the
+    chosen algorithm. Also check that a smaller batch of the same layer
+    reuses the choice without tuning again, and that a new autotuner reads
+    the choices back from its JSON file.
+
+    Every shape is a tuple (N, C, H, W, F, HH, stride, pad) with square
+    filters of size HH.
+
+    Returns a dictionary mapping every shape to the chosen algorithm, the
+    tuning seconds, the seconds per lookup and the seconds per forward pass
+    with and without the autotuner.
+    """
+    from scripts.fast_layers import CONV_ALGORITHMS, ConvAutotuner
+
+    cache_dir = tempfile.mkdtemp()
+    cache_file = os.path.join(cache_dir, "conv_autotune.json")
+    rng = np.random.RandomState(seed)
+    results = {}
+    try:
+        tuner = ConvAutotuner(cache_file=cache_file)
+        for shape in shapes:
+            N, C, H, W, F, HH, stride, pad = shape
+            x = rng.randn(N, C, H, W)
+            w = rng.randn(F, C, HH, HH)
+            b = rng.randn(F)
+            conv_param = {"stride": stride, "pad": pad}
+            tune_time, method = time_function(tuner.choose, x, w, b, conv_param)
+            lookup_time, _ = _time_repeated(tuner.choose, (x, w, b, conv_param), 1000)
+            num_choices = len(tuner.choices)
+            assert tuner.choose(x[: N // 2 + 1], w, b, conv_param) == method
+            assert len(tuner.choices) == num_choices
+            forward = CONV_ALGORITHMS[method][0]
+
+            def tuned_forward():
+                return CONV_ALGORITHMS[tuner.choose(x, w, b, conv_param)][0](
+                    x, w, b, conv_param
+                )
+
+            tuned_time, _ = _time_repeated(tuned_forward, (), num_iters)
+            direct_time, _ = _time_repeated(forward, (x, w, b, conv_param), num_iters)
+            results[shape] = (method, tune_time, lookup_time, tuned_time, direct_time)
+            print(
+                "%s %s: tuning %fs, lookup %.1fus, forward %fs tuned, %fs direct"
+                % (shape, method, tune_time, 1e6 * lookup_time, tuned_time, direct_time)
+            )
+        assert ConvAutotuner(cache_file=cache_file).choices == tuner.choices
+    finally:
+        shutil.rmtree(cache_dir)
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_lazy_cifar10()
+    benchmark_tiny_imagenet()
+    benchmark_tiny_imagenet_stream()
+    benchmark_conv_layers()
+    benchmark_im2col()
+    benchmark_im2col_threads()
+    benchmark_conv_algorithms()
+    benchmark_conv_autotune()
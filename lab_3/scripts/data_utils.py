@@ -1,9 +1,11 @@
 from __future__ import print_function
 
 from builtins import range
+from builtins import object
 from six.moves import cPickle as pickle
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
 from imageio import imread
 import platform
 
@@ -17,45 +19,120 @@ def load_pickle(f):
     raise ValueError("invalid python version: {}".format(version))
 
 
-def load_CIFAR_batch(filename):
-    """ load single batch of cifar """
+def load_CIFAR_batch(filename, dtype=np.float64):
+    """ load single batch of cifar, converted to dtype """
     with open(filename, "rb") as f:
         datadict = load_pickle(f)
         X = datadict["data"]
         Y = datadict["labels"]
-        X = X.reshape(10000, 3, 32, 32).transpose(0, 2, 3, 1).astype("float")
+        # C order keeps images contiguous for minibatch gathers and np.save.
+        X = X.reshape(10000, 3, 32, 32).transpose(0, 2, 3, 1)
+        X = X.astype(dtype, order="C")
         Y = np.array(Y)
         return X, Y
 
 
-def load_CIFAR10(ROOT):
-    """ load all of cifar """
+def load_CIFAR10(ROOT, dtype=np.float64, cache=False, cache_dir=None):
+    """
+    load all of cifar, converted to dtype (None keeps the raw uint8 pixels).
+
+    With cache=True the batches are converted once by cache_CIFAR10 and later
+    calls load the uint8 cache instead of unpickling. With dtype=None the
+    images are then returned as read-only memory maps, so nothing is read
+    until it is used; convert minibatches to float as they are drawn, e.g.
+    X_train[idx].astype(np.float32).
+    """
+    if cache:
+        cache_dir = cache_CIFAR10(ROOT, cache_dir)
+        Xtr, Ytr, Xte, Yte = [
+            np.load(os.path.join(cache_dir, name), mmap_mode="r")
+            for name in CIFAR10_CACHE_FILES
+        ]
+        Ytr, Yte = np.array(Ytr), np.array(Yte)
+        if dtype is not None:
+            Xtr, Xte = Xtr.astype(dtype), Xte.astype(dtype)
+        return Xtr, Ytr, Xte, Yte
+
+    dtype = dtype or np.uint8
     xs = []
     ys = []
     for b in range(1, 6):
         f = os.path.join(ROOT, "data_batch_%d" % (b,))
-        X, Y = load_CIFAR_batch(f)
+        X, Y = load_CIFAR_batch(f, dtype=dtype)
         xs.append(X)
         ys.append(Y)
     Xtr = np.concatenate(xs)
     Ytr = np.concatenate(ys)
     del X, Y
-    Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, "test_batch"))
+    Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, "test_batch"), dtype=dtype)
     return Xtr, Ytr, Xte, Yte
 
 
+CIFAR10_CACHE_FILES = ("X_train.npy", "y_train.npy", "X_test.npy", "y_test.npy")
+
+
+def cache_CIFAR10(ROOT, cache_dir=None):
+    """
+    Convert the pickled CIFAR-10 batches to uint8 .npy files that
+    load_CIFAR10(..., cache=True) can memory-map. Does nothing if the cache
+    already exists. Every file is written under a temporary name and renamed
+    when complete, so an interrupted conversion is redone on the next call.
+
+    Inputs:
+    - ROOT: The cifar-10-batches-py directory.
+    - cache_dir: Directory of the cache; defaults to cifar-10-batches-npy
+      next to ROOT.
+
+    Returns the cache directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.path.dirname(os.path.normpath(ROOT)), "cifar-10-batches-npy"
+        )
+    paths = [os.path.join(cache_dir, name) for name in CIFAR10_CACHE_FILES]
+    if all(os.path.exists(path) for path in paths):
+        return cache_dir
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    arrays = load_CIFAR10(ROOT, dtype=np.uint8)
+    for path, a in zip(paths, arrays):
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, a)
+        os.replace(tmp_path, path)
+    return cache_dir
+
+
 def get_CIFAR10_data(
-    num_training=49000, num_validation=1000, num_test=1000, subtract_mean=True
+    num_training=49000,
+    num_validation=1000,
+    num_test=1000,
+    subtract_mean=True,
+    lazy=False,
+    dtype=np.float64,
+    cifar10_dir=None,
 ):
     """
     Load the CIFAR-10 dataset from disk and perform preprocessing to prepare
     it for classifiers. These are the same steps as we used for the SVM, but
     condensed to a single function.
+
+    With lazy=True the images are not preprocessed up front. X_train, X_val
+    and X_test are then CIFAR10Images over slices of the memory-mapped uint8
+    cache (see load_CIFAR10), which subtract the mean and move the channels
+    first for the images of each minibatch as it is indexed. Solver can be
+    given these directly. dtype is the datatype of those minibatches and is
+    ignored otherwise.
     """
     # Load the raw CIFAR-10 data
-    cifar10_dir = os.path.join(
-        os.path.dirname(__file__), "datasets/cifar-10-batches-py"
-    )
+    if cifar10_dir is None:
+        cifar10_dir = os.path.join(
+            os.path.dirname(__file__), "datasets/cifar-10-batches-py"
+        )
+    if lazy:
+        return _get_lazy_CIFAR10_data(
+            cifar10_dir, num_training, num_validation, num_test, subtract_mean, dtype
+        )
     X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir)
 
     # Subsample the data
@@ -92,6 +169,220 @@ def get_CIFAR10_data(
     }
 
 
+class BatchStream(object):
+    """
+    An iterable of (X_batch, y_batch) minibatches that are read from disk one
+    chunk at a time, so that training can start before, and without, the
+    whole dataset being loaded.
+
+    Every iteration over the stream is one pass (epoch) over the data. With
+    shuffle_buffer > 0 the chunks are read in a random order and the images
+    are shuffled within a window of about shuffle_buffer images plus one
+    chunk, which bounds the memory; the shuffle is different on every pass
+    and deterministic under the seed. The last batch of a pass may be
+    smaller than batch_size.
+
+    Solver accepts a BatchStream as data["train_batches"].
+
+    Example usage:
+
+    stream = stream_tiny_imagenet(path, batch_size=100, shuffle_buffer=10000)
+    for X_batch, y_batch in stream:
+        ...
+    """
+
+    def __init__(
+        self,
+        read_chunks,
+        num_samples,
+        num_classes,
+        batch_size=200,
+        shuffle_buffer=0,
+        dtype=np.float64,
+        transform=None,
+        seed=None,
+    ):
+        """
+        Inputs:
+        - read_chunks: Function that takes a RandomState and returns an
+          iterator over (X_chunk, y_chunk) arrays; it should visit the chunks
+          in a random order if shuffle_buffer > 0.
+        - num_samples: Number of images in one pass.
+        - num_classes: Number of classes.
+        - batch_size: Number of images per minibatch.
+        - shuffle_buffer: Number of images held back for shuffling; 0 yields
+          the images in the order they are read.
+        - dtype: numpy datatype of X_batch.
+        - transform: Optional function applied to every X_batch after the
+          cast, e.g. to subtract a mean image or to reorder the axes.
+        - seed: Seed of the shuffle. If None, it is drawn from the global
+          np.random state.
+        """
+        self.read_chunks = read_chunks
+        self.num_samples = num_samples
+        self.num_classes = num_classes
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.dtype = dtype
+        self.transform = transform
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(seed)
+
+    def __len__(self):
+        """Number of minibatches in one pass."""
+        return -(-self.num_samples // self.batch_size)
+
+    def __iter__(self):
+        X_pool, y_pool = None, None
+        for X, y in self.read_chunks(self.rng):
+            if X_pool is None:
+                X_pool, y_pool = X, y
+            else:
+                X_pool = np.concatenate([X_pool, X])
+                y_pool = np.concatenate([y_pool, y])
+            if self.shuffle_buffer > 0:
+                perm = self.rng.permutation(len(y_pool))
+                X_pool, y_pool = X_pool[perm], y_pool[perm]
+            num_ready = len(y_pool) - self.shuffle_buffer
+            num_ready = max(0, num_ready // self.batch_size * self.batch_size)
+            for start in range(0, num_ready, self.batch_size):
+                yield self._batch(X_pool, y_pool, start)
+            X_pool, y_pool = X_pool[num_ready:], y_pool[num_ready:]
+        if X_pool is not None:
+            for start in range(0, len(y_pool), self.batch_size):
+                yield self._batch(X_pool, y_pool, start)
+
+    def _batch(self, X_pool, y_pool, start):
+        stop = start + self.batch_size
+        X_batch = X_pool[start:stop].astype(self.dtype)
+        if self.transform is not None:
+            X_batch = self.transform(X_batch)
+        return X_batch, np.array(y_pool[start:stop])
+
+
+def stream_CIFAR10(
+    ROOT,
+    batch_size=200,
+    shuffle_buffer=0,
+    train=True,
+    dtype=np.float64,
+    transform=None,
+    seed=None,
+):
+    """
+    Stream CIFAR-10 minibatches straight from the pickled batches, one batch
+    file of 10000 images in memory at a time; see BatchStream.
+
+    Inputs:
+    - ROOT: The cifar-10-batches-py directory.
+    - train: If True stream the five training batches, else the test batch.
+    - batch_size, shuffle_buffer, dtype, transform, seed: As for BatchStream.
+
+    Returns a BatchStream whose X_batch has shape (batch_size, 32, 32, 3), as
+    the images of load_CIFAR10; pass
+    transform=lambda X: X.transpose(0, 3, 1, 2) to train a model with Solver.
+    """
+    if train:
+        names = ["data_batch_%d" % b for b in range(1, 6)]
+    else:
+        names = ["test_batch"]
+
+    def read_chunks(rng):
+        order = range(len(names))
+        if shuffle_buffer > 0:
+            order = rng.permutation(len(names))
+        for i in order:
+            yield load_CIFAR_batch(os.path.join(ROOT, names[i]), dtype=np.uint8)
+
+    return BatchStream(
+        read_chunks,
+        10000 * len(names),
+        10,
+        batch_size=batch_size,
+        shuffle_buffer=shuffle_buffer,
+        dtype=dtype,
+        transform=transform,
+        seed=seed,
+    )
+
+
+class CIFAR10Images(object):
+    """
+    A read-only array of images of shape (N, C, H, W) that are stored as
+    uint8 in (N, H, W, C) order, e.g. in a memory map of the CIFAR-10 cache.
+
+    Indexing with an integer, a slice or an array of indices converts only
+    the selected images: they are cast to dtype, the mean image is
+    subtracted and the channels are moved first. This supports the
+    X.shape[0], X[batch_mask] and X[start:end] accesses of Solver, so only
+    one minibatch is ever held as floats.
+    """
+
+    def __init__(self, images, mean_image=None, dtype=np.float64):
+        """
+        Inputs:
+        - images: uint8 array of shape (N, H, W, C).
+        - mean_image: Optional array of shape (H, W, C) subtracted from every
+          image.
+        - dtype: numpy datatype of the returned images.
+        """
+        self.images = images
+        self.mean_image = None
+        if mean_image is not None:
+            self.mean_image = np.asarray(mean_image, dtype=dtype)
+        self.dtype = np.dtype(dtype)
+        N, H, W, C = images.shape
+        self.shape = (N, C, H, W)
+        self.ndim = 4
+
+    @property
+    def nbytes(self):
+        return self.images.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        X = self.images[key].astype(self.dtype)
+        if self.mean_image is not None:
+            X -= self.mean_image
+        return np.ascontiguousarray(np.moveaxis(X, -1, -3))
+
+    def __array__(self, dtype=None, copy=None):
+        X = self[:]
+        return X if dtype is None else X.astype(dtype, copy=False)
+
+
+def mean_image(images, chunk_size=1000):
+    """
+    Mean of uint8 images, accumulated in float64 over chunks of chunk_size
+    images so that no float copy of the whole array is made.
+    """
+    total = np.zeros(images.shape[1:])
+    for start in range(0, images.shape[0], chunk_size):
+        total += np.sum(images[start : start + chunk_size], axis=0, dtype=np.float64)
+    return total / images.shape[0]
+
+
+def _get_lazy_CIFAR10_data(
+    cifar10_dir, num_training, num_validation, num_test, subtract_mean, dtype
+):
+    X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir, dtype=None, cache=True)
+    val = slice(num_training, num_training + num_validation)
+    train = slice(num_training)
+    test = slice(num_test)
+    mean = mean_image(X_train[train]) if subtract_mean else None
+    return {
+        "X_train": CIFAR10Images(X_train[train], mean, dtype),
+        "y_train": y_train[train],
+        "X_val": CIFAR10Images(X_train[val], mean, dtype),
+        "y_val": y_train[val],
+        "X_test": CIFAR10Images(X_test[test], mean, dtype),
+        "y_test": y_test[test],
+    }
+
+
 def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
     """
     Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
@@ -115,78 +406,206 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
       (such as in student code) then y_test will be None.
     - mean_image: (3, 64, 64) array giving mean training image
     """
-    # First load wnids
+    index = _tiny_imagenet_index(path)
+    class_names = index["class_names"]
+    y_train, y_val, y_test = index["y_train"], index["y_val"], index["y_test"]
+
+    # Next load training data, which is stored class by class.
+    num_classes = len(class_names)
+    X_train = np.zeros((len(y_train), 3, 64, 64), dtype=dtype)
+    bounds = np.searchsorted(y_train, np.arange(num_classes + 1))
+    for i in range(num_classes):
+        if (i + 1) % 20 == 0:
+            print("loading training data for synset %d / %d" % (i + 1, num_classes))
+        start, stop = bounds[i], bounds[i + 1]
+        _read_images(index["train_files"][start:stop], X_train[start:stop])
+
+    # Next load validation and test data.
+    X_val = np.zeros((len(y_val), 3, 64, 64), dtype=dtype)
+    _read_images(index["val_files"], X_val)
+    X_test = np.zeros((len(index["test_files"]), 3, 64, 64), dtype=dtype)
+    _read_images(index["test_files"], X_test)
+
+    mean_image = X_train.mean(axis=0)
+    if subtract_mean:
+        X_train -= mean_image[None]
+        X_val -= mean_image[None]
+        X_test -= mean_image[None]
+
+    return {
+        "class_names": class_names,
+        "X_train": X_train,
+        "y_train": y_train,
+        "X_val": X_val,
+        "y_val": y_val,
+        "X_test": X_test,
+        "y_test": y_test,
+        "class_names": class_names,
+        "mean_image": mean_image,
+    }
+
+
+def load_tiny_imagenet_parallel(
+    path, dtype=np.float32, subtract_mean=True, n_jobs=-1, cache_dir=None
+):
+    """
+    Load TinyImageNet like load_tiny_imagenet, decoding the images with a
+    pool of worker processes and caching them for later calls.
+
+    The first call writes every split as a packed uint8 array of shape
+    (N, 3, 64, 64) to a .npy file in cache_dir. Every worker decodes chunks
+    of images straight into its own memory map of that file, so no decoded
+    image is sent between processes. The names of the test images are
+    stored next to the cache in test_files.txt, in the order of X_test.
+    Later calls memory-map the cache instead of decoding. Classes, labels
+    and image order are the same as with load_tiny_imagenet.
+
+    Inputs:
+    - path: String giving path to the directory to load.
+    - dtype: numpy datatype used to load the data. If None, the images are
+      returned as read-only uint8 memory maps of the cache and the mean is
+      not subtracted.
+    - subtract_mean: Whether to subtract the mean training image.
+    - n_jobs: Number of worker processes; -1 uses all cores.
+    - cache_dir: Directory of the cache; defaults to path with "-npy"
+      appended.
+
+    Returns: A dictionary with the same entries as load_tiny_imagenet.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.normpath(path) + "-npy"
+    index = _tiny_imagenet_index(path)
+    splits = ["train", "val", "test"]
+    X_paths = [os.path.join(cache_dir, "X_%s.npy" % split) for split in splits]
+    names_path = os.path.join(cache_dir, "test_files.txt")
+    if not all(os.path.exists(p) for p in X_paths + [names_path]):
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        for split, X_path in zip(splits, X_paths):
+            tmp_path = X_path + ".tmp.npy"
+            _decode_images_parallel(index[split + "_files"], tmp_path, n_jobs)
+            os.replace(tmp_path, X_path)
+        test_names = [os.path.basename(f) for f in index["test_files"]]
+        with open(names_path + ".tmp", "w") as f:
+            f.write("".join("%s\n" % name for name in test_names))
+        os.replace(names_path + ".tmp", names_path)
+    X_train, X_val, X_test = [np.load(X_path, mmap_mode="r") for X_path in X_paths]
+
+    if dtype is None:
+        mean_image = np.asarray(np.mean(X_train, axis=0, dtype=np.float64))
+    else:
+        X_train, X_val, X_test = [X.astype(dtype) for X in (X_train, X_val, X_test)]
+        mean_image = X_train.mean(axis=0)
+        if subtract_mean:
+            X_train -= mean_image[None]
+            X_val -= mean_image[None]
+            X_test -= mean_image[None]
+
+    return {
+        "class_names": index["class_names"],
+        "X_train": X_train,
+        "y_train": index["y_train"],
+        "X_val": X_val,
+        "y_val": index["y_val"],
+        "X_test": X_test,
+        "y_test": index["y_test"],
+        "mean_image": mean_image,
+    }
+
+
+def stream_tiny_imagenet(
+    path,
+    split="train",
+    batch_size=200,
+    shuffle_buffer=0,
+    chunk_size=500,
+    dtype=np.float32,
+    transform=None,
+    seed=None,
+):
+    """
+    Stream TinyImageNet minibatches, decoding chunk_size images at a time;
+    see BatchStream. With shuffle_buffer > 0 the image files are also read
+    in a random order, so that the minibatches mix classes even though the
+    training images are stored class by class.
+
+    Inputs:
+    - path: String giving path to the directory to load.
+    - split: "train", "val" or "test"; the test split needs test labels.
+    - chunk_size: Number of images decoded at a time.
+    - batch_size, shuffle_buffer, dtype, transform, seed: As for BatchStream.
+
+    Returns a BatchStream whose X_batch has shape (batch_size, 3, 64, 64) and
+    whose labels are those of load_tiny_imagenet.
+    """
+    index = _tiny_imagenet_index(path)
+    filenames = index[split + "_files"]
+    labels = index["y_" + split]
+    if labels is None:
+        raise ValueError('No labels for split "%s"' % split)
+
+    def read_chunks(rng):
+        order = np.arange(len(filenames))
+        if shuffle_buffer > 0:
+            order = rng.permutation(len(filenames))
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start : start + chunk_size]
+            X = np.empty((len(chunk), 3, 64, 64), dtype=np.uint8)
+            _read_images([filenames[i] for i in chunk], X)
+            yield X, labels[chunk]
+
+    return BatchStream(
+        read_chunks,
+        len(filenames),
+        len(index["class_names"]),
+        batch_size=batch_size,
+        shuffle_buffer=shuffle_buffer,
+        dtype=dtype,
+        transform=transform,
+        seed=seed,
+    )
+
+
+def _tiny_imagenet_index(path):
+    """
+    List the image files and labels of every TinyImageNet split, in the order
+    in which all the TinyImageNet loaders return them: training images class
+    by class in the order of the boxes files, validation images in the order
+    of val_annotations.txt and test images sorted by file name, so that the
+    order does not depend on the filesystem.
+    """
     with open(os.path.join(path, "wnids.txt"), "r") as f:
         wnids = [x.strip() for x in f]
-
-    # Map wnids to integer labels
     wnid_to_label = {wnid: i for i, wnid in enumerate(wnids)}
 
-    # Use words.txt to get names for each class
     with open(os.path.join(path, "words.txt"), "r") as f:
         wnid_to_words = dict(line.split("\t") for line in f)
         for wnid, words in wnid_to_words.items():
             wnid_to_words[wnid] = [w.strip() for w in words.split(",")]
     class_names = [wnid_to_words[wnid] for wnid in wnids]
 
-    # Next load training data.
-    X_train = []
+    train_files = []
     y_train = []
-    for i, wnid in enumerate(wnids):
-        if (i + 1) % 20 == 0:
-            print("loading training data for synset %d / %d" % (i + 1, len(wnids)))
-        # To figure out the filenames we need to open the boxes file
+    for wnid in wnids:
         boxes_file = os.path.join(path, "train", wnid, "%s_boxes.txt" % wnid)
         with open(boxes_file, "r") as f:
             filenames = [x.split("\t")[0] for x in f]
-        num_images = len(filenames)
-
-        X_train_block = np.zeros((num_images, 3, 64, 64), dtype=dtype)
-        y_train_block = wnid_to_label[wnid] * np.ones(num_images, dtype=np.int64)
-        for j, img_file in enumerate(filenames):
-            img_file = os.path.join(path, "train", wnid, "images", img_file)
-            img = imread(img_file)
-            if img.ndim == 2:
-                ## grayscale file
-                img.shape = (64, 64, 1)
-            X_train_block[j] = img.transpose(2, 0, 1)
-        X_train.append(X_train_block)
-        y_train.append(y_train_block)
-
-    # We need to concatenate all training data
-    X_train = np.concatenate(X_train, axis=0)
-    y_train = np.concatenate(y_train, axis=0)
-
-    # Next load validation data
+        train_files += [
+            os.path.join(path, "train", wnid, "images", img_file)
+            for img_file in filenames
+        ]
+        y_train += [wnid_to_label[wnid]] * len(filenames)
+
     with open(os.path.join(path, "val", "val_annotations.txt"), "r") as f:
-        img_files = []
-        val_wnids = []
+        val_files = []
+        y_val = []
         for line in f:
             img_file, wnid = line.split("\t")[:2]
-            img_files.append(img_file)
-            val_wnids.append(wnid)
-        num_val = len(img_files)
-        y_val = np.array([wnid_to_label[wnid] for wnid in val_wnids])
-        X_val = np.zeros((num_val, 3, 64, 64), dtype=dtype)
-        for i, img_file in enumerate(img_files):
-            img_file = os.path.join(path, "val", "images", img_file)
-            img = imread(img_file)
-            if img.ndim == 2:
-                img.shape = (64, 64, 1)
-            X_val[i] = img.transpose(2, 0, 1)
-
-    # Next load test images
-    # Students won't have test labels, so we need to iterate over files in the
-    # images directory.
-    img_files = os.listdir(os.path.join(path, "test", "images"))
-    X_test = np.zeros((len(img_files), 3, 64, 64), dtype=dtype)
-    for i, img_file in enumerate(img_files):
-        img_file = os.path.join(path, "test", "images", img_file)
-        img = imread(img_file)
-        if img.ndim == 2:
-            img.shape = (64, 64, 1)
-        X_test[i] = img.transpose(2, 0, 1)
+            val_files.append(os.path.join(path, "val", "images", img_file))
+            y_val.append(wnid_to_label[wnid])
 
+    img_files = sorted(os.listdir(os.path.join(path, "test", "images")))
+    test_files = [os.path.join(path, "test", "images", f) for f in img_files]
     y_test = None
     y_test_file = os.path.join(path, "test", "test_annotations.txt")
     if os.path.isfile(y_test_file):
@@ -198,25 +617,52 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
         y_test = [wnid_to_label[img_file_to_wnid[img_file]] for img_file in img_files]
         y_test = np.array(y_test)
 
-    mean_image = X_train.mean(axis=0)
-    if subtract_mean:
-        X_train -= mean_image[None]
-        X_val -= mean_image[None]
-        X_test -= mean_image[None]
-
     return {
         "class_names": class_names,
-        "X_train": X_train,
-        "y_train": y_train,
-        "X_val": X_val,
-        "y_val": y_val,
-        "X_test": X_test,
+        "train_files": train_files,
+        "y_train": np.array(y_train, dtype=np.int64),
+        "val_files": val_files,
+        "y_val": np.array(y_val),
+        "test_files": test_files,
         "y_test": y_test,
-        "class_names": class_names,
-        "mean_image": mean_image,
     }
 
 
+def _decode_images_parallel(filenames, out_path, n_jobs, chunk_size=256):
+    """
+    Decode 64x64 images into a new uint8 .npy file of shape (N, 3, 64, 64),
+    spreading chunks of chunk_size images over n_jobs worker processes.
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    out = np.lib.format.open_memmap(
+        out_path, mode="w+", dtype=np.uint8, shape=(len(filenames), 3, 64, 64)
+    )
+    del out  # the header is written; workers map the file themselves
+    starts = range(0, len(filenames), chunk_size)
+    chunks = [filenames[start : start + chunk_size] for start in starts]
+    if n_jobs == 1:
+        for start, chunk in zip(starts, chunks):
+            _decode_images(out_path, start, chunk)
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            list(pool.map(_decode_images, [out_path] * len(chunks), starts, chunks))
+
+
+def _decode_images(out_path, start, filenames):
+    out = np.load(out_path, mmap_mode="r+")
+    _read_images(filenames, out[start : start + len(filenames)])
+    out.flush()
+
+
+def _read_images(filenames, out):
+    for j, img_file in enumerate(filenames):
+        img = imread(img_file)
+        if img.ndim == 2:
+            img.shape = (64, 64, 1)
+        out[j] = img.transpose(2, 0, 1)
+
+
 def load_models(models_dir):
     """
     Load saved models from disk. This will attempt to unpickle all files in a
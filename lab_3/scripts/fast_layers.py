@@ -1,16 +1,42 @@
+"""
+Fast convolution and max pooling layers.
+
+conv_forward_fast and conv_backward_fast pick the conv algorithm for a layer
+shape with the choose_conv_algorithm heuristic, so they do no timing and
+always give the same choice. To pick by measurement instead, set
+
+    from scripts import fast_layers
+    fast_layers.use_autotuner = True
+
+and conv_forward_fast then goes through conv_autotuner, which times every
+algorithm the first time it sees a layer shape and keeps its choices in
+CONV_AUTOTUNE_CACHE. conv_forward_autotune and conv_backward_autotune call
+the autotuner directly whatever the setting.
+"""
 from __future__ import print_function
+import json
+import os
+import time
+
 import numpy as np
-from .im2col_cython import col2im_6d_cython
+from .im2col import *
+
 try:
-    from .im2col_cython import col2im_cython, im2col_cython
-    from .im2col_cython import col2im_6d_cython
+    # The conv layers use the multithreaded kernels; the number of threads is
+    # set with im2col_cython.set_num_threads.
+    from .im2col_cython import col2im_cython_parallel as col2im_cython
+    from .im2col_cython import im2col_cython_parallel as im2col_cython
+    from .im2col_cython import col2im_6d_cython_parallel as col2im_6d_cython
+    HAVE_CYTHON = True
 except ImportError:
     print("""=========== You can safely ignore the message below if you are NOT working on ConvolutionalNetworks.ipynb ===========""")
-    print("\tYou will need to compile a Cython extension for a portion of this assignment.")
-    print("\tThe instructions to do this will be given in a section of the notebook below.")
-    print("\tThere will be an option for Colab users and another for Jupyter (local) users.")
-
-from .im2col import *
+    print("\tThe im2col_cython extension is not compiled; using NumPy instead.")
+    print("\tTo compile it run: cd scripts && python setup.py build_ext --inplace")
+    # Same signatures and layouts as the compiled kernels.
+    im2col_cython = im2col_numpy
+    col2im_cython = col2im_numpy
+    col2im_6d_cython = col2im_6d_numpy
+    HAVE_CYTHON = False
 
 
 def conv_forward_im2col(x, w, b, conv_param):
@@ -136,8 +162,409 @@ def conv_backward_im2col(dout, cache):
     return dx, dw, db
 
 
-conv_forward_fast = conv_forward_strides
-conv_backward_fast = conv_backward_strides
+# Winograd F(2x2, 3x3) transforms (Lavin and Gray, 2015): each 4x4 input tile
+# d and 3x3 filter g give the 2x2 output tile A^T [(G g G^T) * (B^T d B)] A.
+WINOGRAD_BT = np.array(
+    [[1, 0, -1, 0], [0, 1, 1, 0], [0, -1, 1, 0], [0, 1, 0, -1]], dtype=np.float64
+)
+WINOGRAD_G = np.array(
+    [[1, 0, 0], [0.5, 0.5, 0.5], [0.5, -0.5, 0.5], [0, 0, 1]], dtype=np.float64
+)
+WINOGRAD_AT = np.array([[1, 1, 1, 0], [0, 1, -1, -1]], dtype=np.float64)
+
+
+def _winograd_transform(M, x):
+    """
+    Compute M X M^T for every 2D slice X = x[:, :, ...] of x, where M is one
+    of the small Winograd matrices, as a single matrix multiply by kron(M, M).
+    """
+    a, b = M.shape
+    rest = x.shape[2:]
+    x = np.ascontiguousarray(x).reshape(b * b, -1)
+    return np.dot(np.kron(M, M).astype(x.dtype), x).reshape((a, a) + rest)
+
+
+def conv_forward_winograd(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer with
+    3x3 filters and stride 1, based on the Winograd F(2x2, 3x3) algorithm.
+
+    The output is computed in 2x2 tiles from overlapping 4x4 input tiles with
+    16 multiplications per tile instead of 36, and the sum over the channels
+    becomes 16 matrix multiplies. The input tiles take 4x the memory of the
+    input instead of the 9x of im2col.
+    """
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    stride, pad = conv_param["stride"], conv_param["pad"]
+    assert HH == WW == 3 and stride == 1, "Winograd needs 3x3 filters, stride 1"
+
+    out_h = H + 2 * pad - 2
+    out_w = W + 2 * pad - 2
+    tiles_h = (out_h + 1) // 2
+    tiles_w = (out_w + 1) // 2
+
+    # Pad the bottom and right a bit more so that the tiles cover the output.
+    x_padded = np.pad(
+        x,
+        (
+            (0, 0),
+            (0, 0),
+            (pad, 2 * tiles_h + 2 - H - pad),
+            (pad, 2 * tiles_w + 2 - W - pad),
+        ),
+        mode="constant",
+    )
+    # tiles[i, j, c, n, t, u] = x_padded[n, c, 2t + i, 2u + j]
+    tiles = np.lib.stride_tricks.sliding_window_view(x_padded, (4, 4), axis=(2, 3))
+    tiles = tiles[:, :, ::2, ::2].transpose(4, 5, 1, 0, 2, 3)
+
+    V = _winograd_transform(WINOGRAD_BT, tiles)
+    V = V.reshape(4, 4, C, -1)
+    U = _winograd_transform(WINOGRAD_G, w.transpose(2, 3, 0, 1))
+    Y = _winograd_transform(WINOGRAD_AT, np.matmul(U, V))
+
+    # Y[a, b, f, n, t, u] is out[n, f, 2t + a, 2u + b]
+    Y = Y.reshape(2, 2, F, N, tiles_h, tiles_w).transpose(3, 2, 4, 0, 5, 1)
+    out = Y.reshape(N, F, 2 * tiles_h, 2 * tiles_w)[:, :, :out_h, :out_w]
+    out = np.ascontiguousarray(out) + b.reshape(1, -1, 1, 1)
+
+    cache = (x, w, b, conv_param, U, V)
+    return out, cache
+
+
+def conv_backward_winograd(dout, cache):
+    """
+    A fast implementation of the backward pass for a convolutional layer
+    based on the Winograd F(2x2, 3x3) algorithm; the cache must come from
+    conv_forward_winograd. Every step of the forward pass is linear, so the
+    gradients run the same transforms transposed.
+    """
+    x, w, b, conv_param, U, V = cache
+    pad = conv_param["pad"]
+    N, C, H, W = x.shape
+    F = w.shape[0]
+    tiles_h, tiles_w = (dout.shape[2] + 1) // 2, (dout.shape[3] + 1) // 2
+
+    db = np.sum(dout, axis=(0, 2, 3))
+
+    dY = np.zeros((N, F, 2 * tiles_h, 2 * tiles_w), dtype=dout.dtype)
+    dY[:, :, : dout.shape[2], : dout.shape[3]] = dout
+    dY = dY.reshape(N, F, tiles_h, 2, tiles_w, 2).transpose(3, 5, 1, 0, 2, 4)
+    dM = _winograd_transform(WINOGRAD_AT.T, dY)
+    dM = dM.reshape(4, 4, F, -1)
+
+    dU = np.matmul(dM, V.transpose(0, 1, 3, 2))
+    dw = _winograd_transform(WINOGRAD_G.T, dU)
+    dw = np.ascontiguousarray(dw.transpose(2, 3, 0, 1))
+
+    dV = np.matmul(U.transpose(0, 1, 3, 2), dM)
+    dV = _winograd_transform(WINOGRAD_BT.T, dV)
+    # Add the overlapping 4x4 tiles back into the padded input.
+    dV = dV.reshape(4, 4, C, N, tiles_h, tiles_w).transpose(2, 0, 1, 3, 4, 5)
+    Hp, Wp = 2 * tiles_h + 2, 2 * tiles_w + 2
+    dx = col2im_6d_cython(np.ascontiguousarray(dV), N, C, Hp, Wp, 4, 4, 0, 2)
+    dx = np.ascontiguousarray(dx[:, :, pad : pad + H, pad : pad + W])
+
+    return dx, dw, db
+
+
+def conv_forward_fft(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer
+    based on the FFT.
+
+    Every channel of the padded input and of the filters is transformed once;
+    the sum over the channels then becomes one matrix multiply per frequency.
+    The cost does not grow with the filter size, so this pays off for large
+    filters. Strides larger than 1 compute the stride 1 output and subsample
+    it.
+    """
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    stride, pad = conv_param["stride"], conv_param["pad"]
+    Hp, Wp = H + 2 * pad, W + 2 * pad
+
+    x_padded = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)), mode="constant")
+    x_freq = np.fft.rfft2(x_padded, s=(Hp, Wp))
+    w_freq = np.fft.rfft2(w, s=(Hp, Wp))
+
+    # The cross-correlation is the product with the conjugate filter; the
+    # channels are summed with (N, C) x (C, F) matrix multiplies.
+    out_freq = np.matmul(
+        x_freq.transpose(2, 3, 0, 1), w_freq.conj().transpose(2, 3, 1, 0)
+    )
+    out = np.fft.irfft2(out_freq.transpose(2, 3, 0, 1), s=(Hp, Wp))
+    out = out[:, :, : Hp - HH + 1 : stride, : Wp - WW + 1 : stride]
+    out = np.ascontiguousarray(out, dtype=x.dtype) + b.reshape(1, -1, 1, 1)
+
+    cache = (x, w, b, conv_param, x_freq, w_freq)
+    return out, cache
+
+
+def conv_backward_fft(dout, cache):
+    """
+    A fast implementation of the backward pass for a convolutional layer
+    based on the FFT; the cache must come from conv_forward_fft.
+    """
+    x, w, b, conv_param, x_freq, w_freq = cache
+    stride, pad = conv_param["stride"], conv_param["pad"]
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    Hp, Wp = H + 2 * pad, W + 2 * pad
+
+    db = np.sum(dout, axis=(0, 2, 3))
+
+    # Scatter dout back onto the stride 1 output grid.
+    dout_full = np.zeros((N, F, Hp - HH + 1, Wp - WW + 1), dtype=dout.dtype)
+    dout_full[:, :, ::stride, ::stride] = dout
+    dout_freq = np.fft.rfft2(dout_full, s=(Hp, Wp)).transpose(2, 3, 0, 1)
+
+    # dx is the full convolution of dout with the filters and dw the
+    # cross-correlation of the input with dout.
+    dx_freq = np.matmul(dout_freq, w_freq.transpose(2, 3, 0, 1))
+    dx = np.fft.irfft2(dx_freq.transpose(2, 3, 0, 1), s=(Hp, Wp))
+    dx = np.ascontiguousarray(dx[:, :, pad : pad + H, pad : pad + W], dtype=x.dtype)
+
+    dw_freq = np.matmul(
+        dout_freq.conj().transpose(0, 1, 3, 2), x_freq.transpose(2, 3, 0, 1)
+    )
+    dw = np.fft.irfft2(dw_freq.transpose(2, 3, 0, 1), s=(Hp, Wp))
+    dw = np.ascontiguousarray(dw[:, :, :HH, :WW], dtype=w.dtype)
+
+    return dx, dw, db
+
+
+# The conv algorithms that conv_forward_auto and ConvAutotuner can choose
+# from, as pairs of (forward, backward) functions.
+CONV_ALGORITHMS = {
+    "im2col": (conv_forward_im2col, conv_backward_im2col),
+    "strides": (conv_forward_strides, conv_backward_strides),
+    "winograd": (conv_forward_winograd, conv_backward_winograd),
+    "fft": (conv_forward_fft, conv_backward_fft),
+}
+
+
+def conv_algorithm_supported(method, x_shape, w_shape, conv_param):
+    """
+    Whether the algorithm CONV_ALGORITHMS[method] can run a convolutional
+    layer with these shapes.
+    """
+    H, W = x_shape[2:]
+    HH, WW = w_shape[2:]
+    stride, pad = conv_param["stride"], conv_param["pad"]
+    if method == "im2col":
+        return (H + 2 * pad - HH) % stride == 0 and (W + 2 * pad - WW) % stride == 0
+    if method == "winograd":
+        return HH == WW == 3 and stride == 1
+    return method in CONV_ALGORITHMS
+
+
+def choose_conv_algorithm(x_shape, w_shape, conv_param):
+    """
+    Pick a key of CONV_ALGORITHMS for a convolutional layer from its shapes.
+
+    The rules follow timings with NumPy on CPU: Winograd only beats the
+    strides GEMM with 3x3 filters on wide layers, because it replaces one
+    large matrix multiply with 16 smaller ones; the FFT wins for filters of
+    5x5 and up once there are enough input channels to amortize the
+    transforms, but not on 3-channel images.
+    """
+    C = x_shape[1]
+    F, _, HH, WW = w_shape
+    if conv_param["stride"] != 1:
+        return "strides"
+    if HH == WW == 3 and min(C, F) >= 128:
+        return "winograd"
+    if HH * WW >= 25 and C >= 16:
+        return "fft"
+    return "strides"
+
+
+def conv_forward_auto(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer that
+    runs the algorithm picked by choose_conv_algorithm.
+    """
+    method = choose_conv_algorithm(x.shape, w.shape, conv_param)
+    out, real_cache = CONV_ALGORITHMS[method][0](x, w, b, conv_param)
+    return out, (method, real_cache)
+
+
+def conv_backward_auto(dout, cache):
+    """
+    A fast implementation of the backward pass for a convolutional layer;
+    this runs the backward pass of the algorithm that conv_forward_auto used.
+    """
+    method, real_cache = cache
+    if method not in CONV_ALGORITHMS:
+        raise ValueError('Unrecognized method "%s"' % method)
+    return CONV_ALGORITHMS[method][1](dout, real_cache)
+
+
+class ConvAutotuner(object):
+    """
+    Picks the fastest conv algorithm for every layer shape by timing them.
+
+    The first time a layer with a given (C, H, W, F, HH, WW, stride, pad,
+    dtype) is seen, every supported algorithm in CONV_ALGORITHMS runs its
+    forward and backward pass on the actual inputs, and the fastest one is
+    remembered. Later calls with the same shape only cost a dictionary
+    lookup. The batch size is not part of the key: the cost of every
+    algorithm grows linearly with it, so the choice made on the first batch
+    also holds for the smaller last batch of an epoch or for a larger
+    validation batch, which would otherwise each be tuned again.
+
+    If cache_file is given the choices are also stored there as JSON, so
+    they survive restarts; the file holds timings of one machine, so it
+    should not be shared between machines or kept under version control.
+
+    Example usage:
+
+    tuner = ConvAutotuner(
+        cache_file=os.path.expanduser("~/.cache/neuron/conv_autotune.json")
+    )
+    method = tuner.choose(x, w, b, conv_param)
+    out, cache = CONV_ALGORITHMS[method][0](x, w, b, conv_param)
+    """
+
+    def __init__(self, cache_file=None, num_trials=2):
+        """
+        Inputs:
+        - cache_file: Path of the JSON file of choices, or None to keep them
+          in memory only. A missing or unreadable file is ignored.
+        - num_trials: Number of timed runs of every algorithm; the fastest
+          run counts, which filters out the allocations of the first one.
+        """
+        self.cache_file = cache_file
+        self.num_trials = num_trials
+        self.choices = self._load()
+
+    def choose(self, x, w, b, conv_param):
+        """
+        Return the key of CONV_ALGORITHMS to use for this layer, timing the
+        algorithms on these inputs if the shape has not been seen yet.
+        """
+        _, C, H, W = x.shape
+        F, _, HH, WW = w.shape
+        stride, pad = conv_param["stride"], conv_param["pad"]
+        key = (C, H, W, F, HH, WW, stride, pad, x.dtype.name)
+        method = self.choices.get(key)
+        if method is None:
+            method, _ = self.tune(x, w, b, conv_param)
+            self.choices[key] = method
+            self._save(key, method)
+        return method
+
+    def tune(self, x, w, b, conv_param):
+        """
+        Time the forward and backward pass of every supported algorithm.
+
+        Returns a tuple of:
+        - method: The key of the fastest algorithm.
+        - times: A dictionary mapping every supported algorithm to its best
+          time in seconds.
+        """
+        times = {}
+        dout = None
+        for method, (forward, backward) in CONV_ALGORITHMS.items():
+            if not conv_algorithm_supported(method, x.shape, w.shape, conv_param):
+                continue
+            best = None
+            for _ in range(self.num_trials):
+                tic = time.perf_counter()
+                out, cache = forward(x, w, b, conv_param)
+                if dout is None:
+                    dout = np.ones_like(out)
+                backward(dout, cache)
+                elapsed = time.perf_counter() - tic
+                best = elapsed if best is None else min(best, elapsed)
+            times[method] = best
+        return min(times, key=times.get), times
+
+    def _load(self):
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # The keys are stored as "C,H,W,F,HH,WW,stride,pad,dtype"; skip
+        # algorithms that no longer exist and keys of another layout.
+        choices = {}
+        for key, method in stored.items():
+            fields = key.split(",")
+            if method in CONV_ALGORITHMS and len(fields) == 9:
+                choices[tuple(int(n) for n in fields[:-1]) + (fields[-1],)] = method
+        return choices
+
+    def _save(self, key, method):
+        if self.cache_file is None:
+            return
+        # Merge with the file, in case another process tuned other shapes.
+        choices = self._load()
+        choices[key] = method
+        stored = {",".join(str(n) for n in k): m for k, m in choices.items()}
+        tmp_path = self.cache_file + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(stored, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            print("Could not save the conv autotuning cache: %s" % e)
+
+
+# The choices of the shared autotuner are kept in the user's cache directory,
+# not in the source tree, as they are only valid on this machine.
+CONV_AUTOTUNE_CACHE = os.path.join(
+    os.path.expanduser("~"), ".cache", "neuron", "conv_autotune.json"
+)
+
+# The autotuner behind conv_forward_autotune; it only writes its cache file
+# once it tunes a shape.
+conv_autotuner = ConvAutotuner(cache_file=CONV_AUTOTUNE_CACHE)
+
+# Whether conv_forward_fast uses conv_autotuner instead of the heuristic.
+use_autotuner = False
+
+
+def conv_forward_autotune(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer that
+    runs the algorithm conv_autotuner measured to be fastest for its shape.
+    The first call for a new shape also times every algorithm.
+    """
+    method = conv_autotuner.choose(x, w, b, conv_param)
+    out, real_cache = CONV_ALGORITHMS[method][0](x, w, b, conv_param)
+    return out, (method, real_cache)
+
+
+def conv_backward_autotune(dout, cache):
+    """
+    The backward pass for conv_forward_autotune. It runs the backward pass of
+    the algorithm recorded in the cache rather than asking conv_autotuner
+    again, so it always matches the forward pass that made the cache.
+    """
+    return conv_backward_auto(dout, cache)
+
+
+def conv_forward_fast(x, w, b, conv_param):
+    """
+    A fast implementation of the forward pass for a convolutional layer. It is
+    conv_forward_auto, which costs nothing on the first call of a shape, or
+    conv_forward_autotune if use_autotuner is set.
+    """
+    if use_autotuner:
+        return conv_forward_autotune(x, w, b, conv_param)
+    return conv_forward_auto(x, w, b, conv_param)
+
+
+# Both forward passes record their algorithm in the cache.
+conv_backward_fast = conv_backward_auto
 
 
 def max_pool_forward_fast(x, pool_param):
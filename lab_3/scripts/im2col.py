@@ -51,6 +51,63 @@ def col2im_indices(cols, x_shape, field_height=3, field_width=3, padding=1, stri
     return x_padded[:, :, padding:-padding, padding:-padding]
 
 
+def im2col_numpy(x, field_height, field_width, padding, stride):
+    """
+    A vectorized NumPy version of im2col_cython with the same arguments and
+    output layout: rows are ordered (C, field_height, field_width) and columns
+    (out_height, out_width, N). The receptive fields are a strided view of the
+    padded input, so the only work is one transposing copy into cols.
+    """
+    p = padding
+    x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode="constant")
+    windows = np.lib.stride_tricks.sliding_window_view(
+        x_padded, (field_height, field_width), axis=(2, 3)
+    )[:, :, ::stride, ::stride]
+    N, C, HH, WW = windows.shape[:4]
+    cols = windows.transpose(1, 4, 5, 2, 3, 0)
+    return np.ascontiguousarray(cols).reshape(C * field_height * field_width, -1)
+
+
+def col2im_numpy(cols, N, C, H, W, field_height, field_width, padding, stride):
+    """
+    A vectorized NumPy version of col2im_cython: the inverse layout of
+    im2col_numpy, adding overlapping receptive fields together.
+    """
+    HH = (H + 2 * padding - field_height) // stride + 1
+    WW = (W + 2 * padding - field_width) // stride + 1
+    cols = cols.reshape(C, field_height, field_width, HH, WW, N)
+    # Accumulate with N last, as in cols, and move it first at the end.
+    x_padded = np.zeros((C, H + 2 * padding, W + 2 * padding, N), dtype=cols.dtype)
+    rows_end, cols_end = stride * HH, stride * WW
+    for ii in range(field_height):
+        for jj in range(field_width):
+            x_padded[
+                :, ii : ii + rows_end : stride, jj : jj + cols_end : stride
+            ] += cols[:, ii, jj]
+    x_padded = x_padded[:, padding : padding + H, padding : padding + W]
+    return np.ascontiguousarray(x_padded.transpose(3, 0, 1, 2))
+
+
+def col2im_6d_numpy(cols, N, C, H, W, HH, WW, pad, stride):
+    """
+    A vectorized NumPy version of col2im_6d_cython, for cols of shape
+    (C, HH, WW, N, out_h, out_w). Each of the HH * WW filter taps is added
+    into the padded output with one strided slice.
+    """
+    out_h = (H + 2 * pad - HH) // stride + 1
+    out_w = (W + 2 * pad - WW) // stride + 1
+    # Accumulate in the (C, N) order of cols and swap the axes at the end.
+    x_padded = np.zeros((C, N, H + 2 * pad, W + 2 * pad), dtype=cols.dtype)
+    rows_end, cols_end = stride * out_h, stride * out_w
+    for hh in range(HH):
+        for ww in range(WW):
+            x_padded[
+                :, :, hh : hh + rows_end : stride, ww : ww + cols_end : stride
+            ] += cols[:, hh, ww]
+    x_padded = x_padded[:, :, pad : pad + H, pad : pad + W]
+    return np.ascontiguousarray(x_padded.transpose(1, 0, 2, 3))
+
+
 # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
 pass
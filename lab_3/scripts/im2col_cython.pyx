@@ -1,6 +1,9 @@
+import os
+
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel cimport prange
 
 # DTYPE = np.float64
 # ctypedef np.float64_t DTYPE_t
@@ -16,8 +19,8 @@ def im2col_cython(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
     cdef int H = x.shape[2]
     cdef int W = x.shape[3]
     
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
 
     cdef int p = padding
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.pad(x,
@@ -57,8 +60,8 @@ cdef int im2col_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
 def col2im_cython(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C, int H, int W,
                   int field_height, int field_width, int padding, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
                                         dtype=cols.dtype)
 
@@ -109,8 +112,8 @@ cdef col2im_6d_cython_inner(np.ndarray[DTYPE_t, ndim=6] cols,
 def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int W,
         int HH, int WW, int pad, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int out_h = (H + 2 * pad - HH) / stride + 1
-    cdef int out_w = (W + 2 * pad - WW) / stride + 1
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
                                                   dtype=cols.dtype)
 
@@ -118,4 +121,171 @@ def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int
 
     if pad > 0:
         return x_padded[:, :, pad:-pad, pad:-pad]
-    return x_padded 
+    return x_padded
+
+
+# Number of OpenMP threads of the *_parallel kernels below.
+cdef int _num_threads = os.cpu_count() or 1
+
+
+def set_num_threads(int num_threads):
+    """
+    Set the number of OpenMP threads used by the *_parallel kernels; -1 uses
+    every core. Without OpenMP (see setup.py) they always run on one thread.
+    """
+    global _num_threads
+    if num_threads == -1:
+        num_threads = os.cpu_count() or 1
+    if num_threads < 1:
+        raise ValueError('Invalid num_threads "%s"' % num_threads)
+    _num_threads = num_threads
+
+
+def get_num_threads():
+    """Return the number of threads used by the *_parallel kernels."""
+    return _num_threads
+
+
+def im2col_cython_parallel(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
+                           int field_width, int padding, int stride):
+    """
+    Multithreaded im2col_cython with the same arguments and output. The input
+    is first copied with the batch dimension last, so that every thread fills
+    whole rows of cols with contiguous reads and writes.
+    """
+    cdef int N = x.shape[0]
+    cdef int C = x.shape[1]
+    cdef int H = x.shape[2]
+    cdef int W = x.shape[3]
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
+    cdef int p = padding
+    x_t = np.ascontiguousarray(np.pad(x.transpose(1, 2, 3, 0),
+            ((0, 0), (p, p), (p, p), (0, 0)), mode='constant'))
+    cdef np.ndarray[DTYPE_t, ndim=2] cols = np.empty(
+            (C * field_height * field_width, N * HH * WW), dtype=x.dtype)
+
+    cdef DTYPE_t[:, ::1] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_view = x_t
+
+    im2col_parallel_inner(cols_view, x_view, N, C, HH, WW, field_height,
+                          field_width, stride, _num_threads)
+    return cols
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void im2col_parallel_inner(DTYPE_t[:, ::1] cols,
+                                DTYPE_t[:, :, :, ::1] x_t,
+                                int N, int C, int HH, int WW,
+                                int field_height, int field_width, int stride,
+                                int num_threads) noexcept nogil:
+    cdef int row, c, ii, jj, yy, xx, i, y, x, col
+    cdef int field_size = field_height * field_width
+
+    for row in prange(C * field_size, schedule='static', num_threads=num_threads):
+        c = row // field_size
+        ii = (row // field_width) % field_height
+        jj = row % field_width
+        for yy in range(HH):
+            y = stride * yy + ii
+            for xx in range(WW):
+                x = stride * xx + jj
+                col = (yy * WW + xx) * N
+                for i in range(N):
+                    cols[row, col + i] = x_t[c, y, x, i]
+
+
+def col2im_cython_parallel(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C,
+                           int H, int W, int field_height, int field_width,
+                           int padding, int stride):
+    """
+    Multithreaded col2im_cython with the same arguments and output. The sums
+    are accumulated with the batch dimension last, so that reads and writes
+    are contiguous, and every thread owns whole rows of the output; each
+    element is summed in the same order as in col2im_cython.
+    """
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
+    cdef int p = padding
+    cdef np.ndarray[DTYPE_t, ndim=4] x_t = np.zeros(
+            (C, H + 2 * padding, W + 2 * padding, N), dtype=cols.dtype)
+
+    cdef DTYPE_t[:, ::1] cols_view = np.ascontiguousarray(cols)
+    cdef DTYPE_t[:, :, :, ::1] x_view = x_t
+
+    col2im_parallel_inner(cols_view, x_view, N, C, HH, WW, field_height,
+                          field_width, stride, _num_threads)
+    return np.ascontiguousarray(x_t[:, p:p + H, p:p + W].transpose(3, 0, 1, 2))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void col2im_parallel_inner(DTYPE_t[:, ::1] cols,
+                                DTYPE_t[:, :, :, ::1] x_t,
+                                int N, int C, int HH, int WW,
+                                int field_height, int field_width, int stride,
+                                int num_threads) noexcept nogil:
+    cdef int cy, c, y, ii, jj, row, yy, xx, x, col, i
+    cdef int Hp = x_t.shape[1]
+
+    for cy in prange(C * Hp, schedule='static', num_threads=num_threads):
+        c = cy // Hp
+        y = cy % Hp
+        # Gather the rows of cols that land on row y of channel c.
+        for ii in range(field_height):
+            yy = (y - ii) // stride
+            if y < ii or (y - ii) % stride != 0 or yy >= HH:
+                continue
+            for jj in range(field_width):
+                row = (c * field_height + ii) * field_width + jj
+                for xx in range(WW):
+                    x = stride * xx + jj
+                    col = (yy * WW + xx) * N
+                    for i in range(N):
+                        x_t[c, y, x, i] += cols[row, col + i]
+
+
+def col2im_6d_cython_parallel(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C,
+                              int H, int W, int HH, int WW, int pad,
+                              int stride):
+    """
+    Multithreaded col2im_6d_cython with the same arguments and output. Every
+    thread owns whole (n, c) planes of the output and reads cols row by row.
+    """
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
+    cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros(
+            (N, C, H + 2 * pad, W + 2 * pad), dtype=cols.dtype)
+
+    cdef DTYPE_t[:, :, :, :, :, ::1] cols_view = np.ascontiguousarray(cols)
+    cdef DTYPE_t[:, :, :, ::1] x_view = x_padded
+
+    col2im_6d_parallel_inner(cols_view, x_view, N, C, HH, WW, out_h, out_w,
+                             stride, _num_threads)
+    if pad > 0:
+        return x_padded[:, :, pad:-pad, pad:-pad]
+    return x_padded
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void col2im_6d_parallel_inner(DTYPE_t[:, :, :, :, :, ::1] cols,
+                                   DTYPE_t[:, :, :, ::1] x_padded,
+                                   int N, int C, int HH, int WW,
+                                   int out_h, int out_w, int stride,
+                                   int num_threads) noexcept nogil:
+    cdef int nc, n, c, hh, ww, h, w, y
+
+    for nc in prange(N * C, schedule='static', num_threads=num_threads):
+        n = nc // C
+        c = nc % C
+        for hh in range(HH):
+            for ww in range(WW):
+                for h in range(out_h):
+                    y = stride * h + hh
+                    for w in range(out_w):
+                        x_padded[n, c, y, stride * w + ww] += cols[c, hh, ww, n, h, w]
@@ -685,6 +685,72 @@ def conv_backward_naive(dout, cache):
     return dx, dw, db
 
 
+def conv_forward_vectorized(x, w, b, conv_param):
+    """
+    A vectorized implementation of the forward pass for a convolutional layer,
+    with the same inputs, outputs and cache as conv_forward_naive.
+
+    sliding_window_view gives every receptive field of the padded input as a
+    view of shape (N, C, H', W', HH, WW) without copying, and one tensordot
+    contracts the C, HH and WW axes with the filters. Pure NumPy, so it does
+    not need the Cython extension.
+    """
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    windows = _conv_windows(x, HH, WW, conv_param)
+    out = np.tensordot(windows, w, axes=([1, 4, 5], [1, 2, 3]))  # N, H', W', F
+    out = np.ascontiguousarray(out.transpose(0, 3, 1, 2))
+    out += b[np.newaxis, :, np.newaxis, np.newaxis]
+    cache = (x, w, b, conv_param)
+    return out, cache
+
+
+def conv_backward_vectorized(dout, cache):
+    """
+    A vectorized implementation of the backward pass for a convolutional
+    layer; the counterpart of conv_forward_vectorized. It also accepts the
+    cache of conv_forward_naive.
+
+    dw is one tensordot of dout with the receptive field view. For dx the
+    gradient of every receptive field is computed with one tensordot and then
+    added into the padded input with one strided slice per filter tap, so the
+    only Python loop is over the HH * WW taps.
+    """
+    x, w, b, conv_param = cache
+    N, C, H, W = x.shape
+    F, _, HH, WW = w.shape
+    pad = conv_param.get('pad', 0)
+    stride = conv_param.get('stride', 1)
+    _, _, out_H, out_W = dout.shape
+
+    db = np.sum(dout, axis=(0, 2, 3))
+    windows = _conv_windows(x, HH, WW, conv_param)
+    dw = np.tensordot(dout, windows, axes=([0, 2, 3], [0, 2, 3]))
+
+    dwindows = np.tensordot(dout, w, axes=([1], [0]))  # N, H', W', C, HH, WW
+    dwindows = dwindows.transpose(0, 3, 4, 5, 1, 2)  # N, C, HH, WW, H', W'
+    dx_pad = np.zeros((N, C, H + 2 * pad, W + 2 * pad), dtype=dwindows.dtype)
+    for i in range(HH):
+        for j in range(WW):
+            dx_pad[:, :, i:i + stride * out_H:stride,
+                   j:j + stride * out_W:stride] += dwindows[:, :, i, j]
+    dx = dx_pad[:, :, pad:pad + H, pad:pad + W]
+    return dx, dw, db
+
+
+def _conv_windows(x, HH, WW, conv_param):
+    """
+    View of the receptive fields of a convolution over x, of shape
+    (N, C, H', W', HH, WW).
+    """
+    pad = conv_param.get('pad', 0)
+    stride = conv_param.get('stride', 1)
+    x_pad = np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)), 'constant')
+    windows = np.lib.stride_tricks.sliding_window_view(x_pad, (HH, WW),
+                                                       axis=(2, 3))
+    return windows[:, :, ::stride, ::stride]
+
+
 def max_pool_forward_naive(x, pool_param):
     """
     A naive implementation of the forward pass for a max-pooling layer.
@@ -1,12 +1,34 @@
-from distutils.core import setup
-from distutils.extension import Extension
+import sys
+
+try:
+    from setuptools import Extension, setup
+except ImportError:
+    from distutils.core import setup
+    from distutils.extension import Extension
 from Cython.Build import cythonize
 import numpy
 
+# Build in place with: python setup.py build_ext --inplace
+# This produces im2col_cython.<platform tag>.so on Linux/macOS (or .pyd on
+# Windows) next to this file; fast_layers falls back to NumPy without it.
+#
+# The *_parallel kernels use OpenMP. Apple clang ships without it, so on macOS
+# they are built without OpenMP and run on a single thread.
+if sys.platform == "win32":
+    openmp_compile_args, openmp_link_args = ["/openmp"], []
+elif sys.platform == "darwin":
+    openmp_compile_args, openmp_link_args = [], []
+else:
+    openmp_compile_args, openmp_link_args = ["-fopenmp"], ["-fopenmp"]
+
 extensions = [
     Extension(
-        "im2col_cython", ["im2col_cython.pyx"], include_dirs=[numpy.get_include()]
+        "im2col_cython",
+        ["im2col_cython.pyx"],
+        include_dirs=[numpy.get_include()],
+        extra_compile_args=openmp_compile_args,
+        extra_link_args=openmp_link_args,
     ),
 ]
 
-setup(ext_modules=cythonize(extensions),)
+setup(ext_modules=cythonize(extensions, language_level=3),)
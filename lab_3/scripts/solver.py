@@ -91,6 +91,10 @@ class Solver(object):
           'X_val': Array, shape (N_val, d_1, ..., d_k) of validation images
           'y_train': Array, shape (N_train,) of labels for training images
           'y_val': Array, shape (N_val,) of labels for validation images
+          Instead of 'X_train' and 'y_train' it may contain 'train_batches', a
+          BatchStream (see data_utils) that yields the training minibatches;
+          one epoch is then one pass over the stream, batch_size is ignored
+          and training accuracy is checked on the latest minibatch.
 
         Optional arguments:
         - update_rule: A string giving the name of an update rule in optim.py.
@@ -116,8 +120,10 @@ class Solver(object):
           epoch.
         """
         self.model = model
-        self.X_train = data["X_train"]
-        self.y_train = data["y_train"]
+        self.train_batches = data.get("train_batches")
+        if self.train_batches is None:
+            self.X_train = data["X_train"]
+            self.y_train = data["y_train"]
         self.X_val = data["X_val"]
         self.y_val = data["y_val"]
 
@@ -159,6 +165,8 @@ class Solver(object):
         self.loss_history = []
         self.train_acc_history = []
         self.val_acc_history = []
+        self._batches = None
+        self._last_batch = None
 
         # Make a deep copy of the optim_config for each parameter
         self.optim_configs = {}
@@ -172,10 +180,13 @@ class Solver(object):
         be called manually.
         """
         # Make a minibatch of training data
-        num_train = self.X_train.shape[0]
-        batch_mask = np.random.choice(num_train, self.batch_size)
-        X_batch = self.X_train[batch_mask]
-        y_batch = self.y_train[batch_mask]
+        if self.train_batches is not None:
+            X_batch, y_batch = self._next_batch()
+        else:
+            num_train = self.X_train.shape[0]
+            batch_mask = np.random.choice(num_train, self.batch_size)
+            X_batch = self.X_train[batch_mask]
+            y_batch = self.y_train[batch_mask]
 
         # Compute loss and gradient
         loss, grads = self.model.loss(X_batch, y_batch)
@@ -189,6 +200,20 @@ class Solver(object):
             self.model.params[p] = next_w
             self.optim_configs[p] = next_config
 
+    def _next_batch(self):
+        """
+        Return the next minibatch of the training stream, starting a new pass
+        when the current one is exhausted.
+        """
+        batch = None
+        if self._batches is not None:
+            batch = next(self._batches, None)
+        if batch is None:
+            self._batches = iter(self.train_batches)
+            batch = next(self._batches)
+        self._last_batch = batch
+        return batch
+
     def _save_checkpoint(self):
         if self.checkpoint_name is None:
             return
@@ -255,8 +280,11 @@ class Solver(object):
         """
         Run optimization to train the model.
         """
-        num_train = self.X_train.shape[0]
-        iterations_per_epoch = max(num_train // self.batch_size, 1)
+        if self.train_batches is not None:
+            iterations_per_epoch = max(len(self.train_batches), 1)
+        else:
+            num_train = self.X_train.shape[0]
+            iterations_per_epoch = max(num_train // self.batch_size, 1)
         num_iterations = self.num_epochs * iterations_per_epoch
 
         for t in range(num_iterations):
@@ -282,8 +310,12 @@ class Solver(object):
             first_it = t == 0
             last_it = t == num_iterations - 1
             if first_it or last_it or epoch_end:
+                if self.train_batches is not None:
+                    X_check, y_check = self._last_batch
+                else:
+                    X_check, y_check = self.X_train, self.y_train
                 train_acc = self.check_accuracy(
-                    self.X_train, self.y_train, num_samples=self.num_train_samples
+                    X_check, y_check, num_samples=self.num_train_samples
                 )
                 val_acc = self.check_accuracy(
                     self.X_val, self.y_val, num_samples=self.num_val_samples
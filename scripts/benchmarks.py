@@ -0,0 +1,635 @@
+from __future__ import print_function
+
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+
+from scripts.classifiers.k_nearest_neighbor import KNearestNeighbor
+from scripts.classifiers.knn_index import IVFIndex
+from scripts.classifiers.linear_classifier import LinearSVM, Softmax
+from scripts.classifiers.linear_svm import svm_loss_fused, svm_loss_vectorized
+from scripts.classifiers.softmax import (softmax_loss_fused,
+                                         softmax_loss_vectorized)
+from scripts.gradient_check import (eval_numerical_gradient,
+                                    eval_numerical_gradient_parallel,
+                                    grad_check_directional, grad_check_sampled,
+                                    grad_check_sparse)
+
+
+def time_function(f, *args, **kwargs):
+    """
+    Call a function f with args and return the time (in seconds) that it took
+    to execute together with its result.
+    """
+    tic = time.time()
+    result = f(*args, **kwargs)
+    toc = time.time()
+    return toc - tic, result
+
+
+def temporary_memory(f, *args, **kwargs):
+    """
+    Call f and return the peak number of bytes it allocated on top of what
+    was already allocated, as seen by tracemalloc (NumPy reports its array
+    buffers to tracemalloc).
+    """
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        f(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_knn_voting(num_test=2000, num_train=10000, k=10, num_classes=10,
+                         seed=0):
+    """
+    Compare the vectorized KNearestNeighbor.predict_labels against the
+    reference loop in predict_labels_loop on a random distance matrix.
+
+    Returns a dictionary with the timings of both versions and the fraction of
+    test points on which they agree (they only differ on some vote ties).
+    """
+    rng = np.random.RandomState(seed)
+    dists = rng.rand(num_test, num_train)
+    classifier = KNearestNeighbor()
+    classifier.train(np.zeros((num_train, 1)),
+                     rng.randint(num_classes, size=num_train))
+
+    loop_time, y_loop = time_function(classifier.predict_labels_loop, dists, k=k)
+    print('loop voting took %fs' % loop_time)
+    vec_time, y_vec = time_function(classifier.predict_labels, dists, k=k)
+    print('vectorized voting took %fs' % vec_time)
+    agreement = np.mean(y_loop == y_vec)
+    print('speedup: %.1fx, prediction agreement: %f'
+          % (loop_time / vec_time, agreement))
+
+    return {'loop_time': loop_time, 'vectorized_time': vec_time,
+            'agreement': agreement}
+
+
+def benchmark_knn_parallel(num_test=4000, num_train=20000, dim=784, k=10,
+                           workers=(1, 2, 4, 8), backend='thread',
+                           num_loops=0, seed=0):
+    """
+    Time KNearestNeighbor.predict with a growing number of workers and check
+    that the predictions match the serial ones.
+
+    Returns a dictionary mapping the number of workers to the time it took.
+    """
+    rng = np.random.RandomState(seed)
+    classifier = KNearestNeighbor()
+    classifier.train(rng.rand(num_train, dim), rng.randint(10, size=num_train))
+    X = rng.rand(num_test, dim)
+
+    serial_time, y_serial = time_function(classifier.predict, X, k=k,
+                                          num_loops=num_loops)
+    print('serial: %fs' % serial_time)
+    times = {}
+    for n_jobs in workers:
+        times[n_jobs], y = time_function(classifier.predict, X, k=k,
+                                         num_loops=num_loops, n_jobs=n_jobs,
+                                         backend=backend)
+        print('%d workers (%s): %fs, speedup %.2fx, same as serial: %s'
+              % (n_jobs, backend, times[n_jobs], serial_time / times[n_jobs],
+                 np.array_equal(y, y_serial)))
+    return times
+
+
+def make_blobs(num_points, dim, num_classes=10, blobs_per_class=5, noise=2.5,
+               seed=0):
+    """
+    Random labelled data: every class is a mixture of a few Gaussian blobs.
+    Used as a stand-in for image features when the datasets are not around.
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(num_classes * blobs_per_class, dim)
+    blob = rng.randint(len(centers), size=num_points)
+    X = centers[blob] + noise * rng.randn(num_points, dim)
+    return X, blob % num_classes
+
+
+def benchmark_knn_index(num_train=20000, num_test=2000, dim=784, k=10,
+                        num_lists=128, num_probes=(1, 2, 4, 8, 16, 32), seed=0):
+    """
+    Compare the approximate IVFIndex against the exact num_loops=0 path for a
+    range of num_probe values.
+
+    Reports, for every num_probe, the query throughput, the recall of the
+    exact k nearest neighbors and the accuracy loss against exact kNN.
+    Returns a list with one dictionary per num_probe.
+    """
+    X, y = make_blobs(num_train + num_test, dim, seed=seed)
+    X_train, y_train = X[:num_train], y[:num_train]
+    X_test, y_test = X[num_train:], y[num_train:]
+
+    exact = KNearestNeighbor()
+    exact.train(X_train, y_train)
+    exact_time, y_exact = time_function(exact.predict, X_test, k=k)
+    exact_acc = np.mean(y_exact == y_test)
+    dists = exact.compute_distances_no_loops(X_test)
+    exact_idx = np.argsort(dists, axis=1)[:, :k]
+    print('exact: %.0f queries/s, accuracy %f'
+          % (num_test / exact_time, exact_acc))
+
+    index = IVFIndex(num_lists=num_lists, seed=seed)
+    approx = KNearestNeighbor()
+    build_time, _ = time_function(approx.train, X_train, y_train, index=index)
+    print('index built in %fs' % build_time)
+
+    results = []
+    for num_probe in num_probes:
+        index.num_probe = num_probe
+        query_time, y_approx = time_function(approx.predict, X_test, k=k)
+        closest_idx, _ = index.query(X_test, X_train, approx.X_train_sq, k)
+        recall = np.mean([np.isin(closest_idx[i], exact_idx[i]).mean()
+                          for i in range(num_test)])
+        acc = np.mean(y_approx == y_test)
+        print('num_probe %d: %.0f queries/s, recall@%d %f, accuracy %f '
+              '(%+f vs exact)' % (num_probe, num_test / query_time, k, recall,
+                                  acc, acc - exact_acc))
+        results.append({'num_probe': num_probe, 'time': query_time,
+                        'recall': recall, 'accuracy': acc,
+                        'exact_accuracy': exact_acc})
+    return results
+
+
+def benchmark_knn_cross_validation(num_points=5000, dim=64, num_folds=5,
+                                   ks=(1, 2, 3, 5, 7, 9, 11, 13, 15, 20),
+                                   seed=0):
+    """
+    Compare KNearestNeighbor.cross_validate with the loop that retrains the
+    classifier and recomputes all distances for every (k, fold) pair.
+
+    Returns a dictionary with both timings and whether the accuracies match.
+    """
+    X, y = make_blobs(num_points, dim, seed=seed)
+
+    def cross_validate_loop():
+        X_folds = np.array_split(X, num_folds)
+        y_folds = np.array_split(y, num_folds)
+        k_to_accuracies = {}
+        for k in ks:
+            k_to_accuracies[k] = []
+            for j in range(num_folds):
+                knn = KNearestNeighbor()
+                knn.train(np.vstack(X_folds[:j] + X_folds[j + 1:]),
+                          np.hstack(y_folds[:j] + y_folds[j + 1:]))
+                y_pred = knn.predict(X_folds[j], k=k)
+                k_to_accuracies[k].append(np.mean(y_pred == y_folds[j]))
+        return k_to_accuracies
+
+    loop_time, loop_acc = time_function(cross_validate_loop)
+    print('loop cross-validation took %fs' % loop_time)
+    cv_time, cv_acc = time_function(KNearestNeighbor().cross_validate, X, y,
+                                    ks, num_folds)
+    print('cross_validate took %fs' % cv_time)
+    same = all(np.allclose(loop_acc[k], cv_acc[k]) for k in ks)
+    print('speedup: %.1fx, accuracies equal: %s' % (loop_time / cv_time, same))
+    return {'loop_time': loop_time, 'cross_validate_time': cv_time,
+            'same': same}
+
+
+def benchmark_knn_dtype(cifar10_dir=None, num_train=5000, num_test=500, k=10,
+                        dtypes=(np.float32, np.uint8, np.int8), seed=0):
+    """
+    Compare the storage types of KNearestNeighbor.train(dtype=...) against
+    the float64 baseline: memory of the stored training set, prediction time
+    and accuracy. Also check that integer inputs kept as passed give the
+    same predictions as the float64 baseline.
+
+    If cifar10_dir points to the cifar-10-batches-py directory, the first
+    num_train training and num_test test images of CIFAR-10 are used;
+    otherwise random blobs quantized to bytes stand in for pixels.
+
+    Returns a list with one dictionary per storage type, float64 first.
+    """
+    if cifar10_dir is not None:
+        from scripts.data_utils import load_CIFAR10
+        X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir)
+        X_train = X_train[:num_train].reshape(num_train, -1)
+        y_train = y_train[:num_train]
+        X_test = X_test[:num_test].reshape(num_test, -1)
+        y_test = y_test[:num_test]
+    else:
+        X, y = make_blobs(num_train + num_test, 3072, seed=seed)
+        X = np.clip(np.rint(128 + 16 * X), 0, 255)
+        X_train, y_train = X[:num_train], y[:num_train]
+        X_test, y_test = X[num_train:], y[num_train:]
+
+    results = []
+    for dtype in (None,) + tuple(dtypes):
+        classifier = KNearestNeighbor()
+        classifier.train(X_train, y_train, dtype=dtype)
+        elapsed, y_pred = time_function(classifier.predict, X_test, k=k)
+        acc = np.mean(y_pred == y_test)
+        name = np.dtype(dtype or np.float64).name
+        if results:
+            print('%s: %.1f MB, predict %fs, accuracy %f (%+f vs float64)'
+                  % (name, classifier.X_train.nbytes / 2.0 ** 20, elapsed, acc,
+                     acc - results[0]['accuracy']))
+        else:
+            print('%s: %.1f MB, predict %fs, accuracy %f'
+                  % (name, classifier.X_train.nbytes / 2.0 ** 20, elapsed, acc))
+        results.append({'dtype': name, 'nbytes': classifier.X_train.nbytes,
+                        'time': elapsed, 'accuracy': acc})
+        if dtype is None:
+            y_float = y_pred
+
+    classifier = KNearestNeighbor()
+    classifier.train(X_train.astype(np.int64), y_train)
+    y_int = classifier.predict(X_test.astype(np.int64), k=k)
+    assert np.array_equal(y_int, y_float)
+    return results
+
+
+def benchmark_svm_loss(num_train=200, dim=3073, num_classes=10, num_iters=500,
+                       reg=2.5e4, seed=0):
+    """
+    Per-iteration time and temporary memory of svm_loss_vectorized against
+    svm_loss_fused with a reused cache, on a fixed random minibatch.
+
+    Returns a dictionary with the timings (seconds per call) and the peak
+    temporary bytes of one warm call of each function.
+    """
+    rng = np.random.RandomState(seed)
+    W = 0.001 * rng.randn(dim, num_classes)
+    X = rng.randn(num_train, dim)
+    y = rng.randint(num_classes, size=num_train)
+    cache = {}
+    svm_loss_fused(W, X, y, reg, cache)
+
+    results = {}
+    for name, f in [('vectorized', lambda: svm_loss_vectorized(W, X, y, reg)),
+                    ('fused', lambda: svm_loss_fused(W, X, y, reg, cache))]:
+        elapsed, _ = time_function(lambda: [f() for _ in range(num_iters)])
+        results[name + '_time'] = elapsed / num_iters
+        results[name + '_bytes'] = temporary_memory(f)
+        print('%s: %f ms per call, %d temporary bytes per call'
+              % (name, 1000 * results[name + '_time'], results[name + '_bytes']))
+    return results
+
+
+def benchmark_softmax_loss(sizes=(200, 1000, 10000), dim=3073, num_classes=10,
+                           num_iters=50, reg=2.5e4, seed=0):
+    """
+    Time softmax_loss_vectorized against softmax_loss_fused (float64 and
+    float32) for several minibatch sizes.
+
+    Returns a dictionary mapping every size to the seconds per call of each
+    version.
+    """
+    rng = np.random.RandomState(seed)
+    W = 0.001 * rng.randn(dim, num_classes)
+    results = {}
+    for num_train in sizes:
+        X = rng.randn(num_train, dim)
+        y = rng.randint(num_classes, size=num_train)
+        W32, X32 = W.astype(np.float32), X.astype(np.float32)
+        cache, cache32 = {}, {}
+        versions = [
+            ('vectorized', lambda: softmax_loss_vectorized(W, X, y, reg)),
+            ('fused', lambda: softmax_loss_fused(W, X, y, reg, cache)),
+            ('fused float32',
+             lambda: softmax_loss_fused(W32, X32, y, reg, cache32)),
+        ]
+        results[num_train] = {}
+        for name, f in versions:
+            f()
+            elapsed, _ = time_function(lambda: [f() for _ in range(num_iters)])
+            results[num_train][name] = elapsed / num_iters
+            print('N=%d %s: %f ms per call'
+                  % (num_train, name, 1000 * elapsed / num_iters))
+    return results
+
+
+def benchmark_minibatch_sampling(num_train=49000, dim=3073, num_iters=500,
+                                 batch_size=200, seed=0):
+    """
+    Training throughput of LinearSVM.train with np.random.choice sampling
+    against epoch_mode=True on CIFAR-sized random data.
+
+    Returns a dictionary with the iterations per second of both modes.
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(num_train, dim)
+    y = rng.randint(10, size=num_train)
+    results = {}
+    for epoch_mode in (False, True):
+        np.random.seed(seed)
+        svm = LinearSVM()
+        elapsed, _ = time_function(svm.train, X, y, learning_rate=1e-7,
+                                   reg=2.5e4, num_iters=num_iters,
+                                   batch_size=batch_size, epoch_mode=epoch_mode)
+        name = 'epoch' if epoch_mode else 'random'
+        results[name] = num_iters / elapsed
+        print('%s sampling: %.1f iterations/s' % (name, results[name]))
+    return results
+
+
+def benchmark_grid_search(num_train=10000, dim=3073, workers=(1, 2, 4, 8),
+                          num_iters=300, seed=0):
+    """
+    Wall-clock time of Softmax.grid_search over a 4x4 learning rate /
+    regularization grid for a growing number of worker processes.
+
+    Returns a dictionary mapping the number of workers to the time it took.
+    """
+    X, y = make_blobs(num_train + 1000, dim, seed=seed)
+    grid = {'learning_rate': [1e-7, 1e-6, 1e-5, 1e-4],
+            'reg': [1e2, 1e3, 1e4, 2.5e4], 'num_iters': [num_iters]}
+    times = {}
+    for n_jobs in workers:
+        np.random.seed(seed)
+        times[n_jobs], _ = time_function(
+            Softmax.grid_search, X[:num_train], y[:num_train], X[num_train:],
+            y[num_train:], grid, n_jobs=n_jobs, verbose=False)
+        print('%d workers: %fs, speedup %.2fx'
+              % (n_jobs, times[n_jobs], times[workers[0]] / times[n_jobs]))
+    return times
+
+
+def benchmark_model_bank(num_train=10000, dim=3073, num_models=16,
+                         num_iters=200, batch_size=200, seed=0):
+    """
+    Time a sweep of num_models Softmax configurations trained one after the
+    other with train against the same sweep done with Softmax.train_bank.
+
+    Returns a dictionary with both timings.
+    """
+    X, y = make_blobs(num_train, dim, seed=seed)
+    learning_rates = np.logspace(-7, -5, num_models)
+    regs = np.logspace(2, 4.5, num_models)
+
+    def sequential():
+        for lr, reg in zip(learning_rates, regs):
+            Softmax().train(X, y, learning_rate=lr, reg=reg,
+                            num_iters=num_iters, batch_size=batch_size)
+
+    np.random.seed(seed)
+    seq_time, _ = time_function(sequential)
+    print('%d models one by one: %fs' % (num_models, seq_time))
+    np.random.seed(seed)
+    bank_time, _ = time_function(Softmax.train_bank, X, y, learning_rates,
+                                 regs, num_iters=num_iters,
+                                 batch_size=batch_size)
+    print('%d models as a bank: %fs, speedup %.1fx'
+          % (num_models, bank_time, seq_time / bank_time))
+    return {'sequential_time': seq_time, 'bank_time': bank_time}
+
+
+def benchmark_float32_training(num_train=10000, dim=3073, num_iters=200,
+                               batch_size=200, seed=0):
+    """
+    Time LinearSVM and Softmax training on float64 data against the same
+    training on float32 data, and check that float32 data stays float32 in
+    the weights and the loss.
+
+    Returns a dictionary mapping every classifier name to its float64 and
+    float32 seconds.
+    """
+    X, y = make_blobs(num_train, dim, seed=seed)
+    X32 = X.astype(np.float32)
+    results = {}
+    for cls in [LinearSVM, Softmax]:
+        times = {}
+        for data in [X, X32]:
+            np.random.seed(seed)
+            model = cls()
+            elapsed, _ = time_function(model.train, data, y, learning_rate=1e-7,
+                                       reg=2.5e4, num_iters=num_iters,
+                                       batch_size=batch_size)
+            loss, grad = model.loss(data[:batch_size], y[:batch_size], 2.5e4)
+            assert model.W.dtype == data.dtype and grad.dtype == data.dtype
+            assert np.asarray(loss).dtype == data.dtype
+            times[data.dtype.name] = elapsed
+        print('%s float64: %fs, float32: %fs, speedup %.1fx'
+              % (cls.__name__, times['float64'], times['float32'],
+                 times['float64'] / times['float32']))
+        results[cls.__name__] = times
+    return results
+
+
+def _svm_loss_value(W, X, y, reg):
+    return svm_loss_vectorized(W, X, y, reg)[0]
+
+
+def benchmark_gradient_check(num_train=100, dim=3073, num_classes=10,
+                             small_dim=300, workers=(1, 2, 4), seed=0):
+    """
+    Time the gradient checkers on the SVM loss of a CIFAR-sized W.
+
+    The full centered difference gradient is timed on a smaller W, serially
+    with eval_numerical_gradient and with eval_numerical_gradient_parallel
+    for several numbers of workers, and the results are checked to be equal.
+
+    Returns a dictionary mapping every checker to its seconds.
+    """
+    rng = np.random.RandomState(seed)
+    X = rng.randn(num_train, dim)
+    y = rng.randint(num_classes, size=num_train)
+    W = 0.001 * rng.randn(dim, num_classes)
+    f = partial(_svm_loss_value, X=X, y=y, reg=0.0)
+    _, grad = svm_loss_vectorized(W, X, y, 0.0)
+
+    results = {}
+    for name, check in [
+            ('sparse', lambda: grad_check_sparse(f, W, grad, num_checks=10)),
+            ('directional', lambda: grad_check_directional(f, W, grad,
+                                                           num_checks=10,
+                                                           seed=seed)),
+            ('sampled', lambda: grad_check_sampled(f, W, grad, num_checks=30,
+                                                   seed=seed))]:
+        results[name], _ = time_function(check)
+    for name in ['sparse', 'directional', 'sampled']:
+        print('%s check: %fs' % (name, results[name]))
+
+    f_small = partial(_svm_loss_value, X=X[:, :small_dim], y=y, reg=0.0)
+    W_small = W[:small_dim]
+    results['full'], reference = time_function(
+        eval_numerical_gradient, f_small, W_small.copy(), verbose=False)
+    print('full gradient of %d coordinates: %fs'
+          % (W_small.size, results['full']))
+    for n_jobs in workers:
+        elapsed, grad_numerical = time_function(
+            eval_numerical_gradient_parallel, f_small, W_small, n_jobs=n_jobs)
+        assert np.array_equal(grad_numerical, reference)
+        results['full_%d' % n_jobs] = elapsed
+        print('full gradient with %d workers: %fs, speedup %.1fx'
+              % (n_jobs, elapsed, results['full'] / elapsed))
+
+    # A sampled check of every coordinate must agree with the dense one.
+    f_tiny = partial(_svm_loss_value, X=X[:, :20], y=y, reg=0.0)
+    W_tiny = W[:20]
+    _, grad_tiny = svm_loss_vectorized(W_tiny, X[:, :20], y, 0.0)
+    dense = eval_numerical_gradient(f_tiny, W_tiny.copy(), verbose=False)
+    dense_errors = (np.abs(dense - grad_tiny)
+                    / np.maximum(np.abs(dense) + np.abs(grad_tiny), 1e-300))
+    sampled = grad_check_sampled(f_tiny, W_tiny, grad_tiny,
+                                 num_checks=W_tiny.size, seed=seed)
+    assert sorted(sampled['indices']) == sorted(np.ndindex(W_tiny.shape))
+    rows, cols = zip(*sampled['indices'])
+    assert np.allclose(sampled['rel_errors'], dense_errors[rows, cols])
+    assert sampled['exceed_fraction'] == 0.0
+    return results
+
+
+def write_fake_CIFAR10(root, seed=0):
+    """
+    Write random images in the format of cifar-10-batches-py to root, so that
+    the loaders can be benchmarked without downloading CIFAR-10.
+    """
+    rng = np.random.RandomState(seed)
+    names = ['data_batch_%d' % b for b in range(1, 6)] + ['test_batch']
+    for name in names:
+        batch = {'data': rng.randint(256, size=(10000, 3072)).astype(np.uint8),
+                 'labels': list(rng.randint(10, size=10000))}
+        with open(os.path.join(root, name), 'wb') as f:
+            pickle.dump(batch, f, protocol=2)
+
+
+def benchmark_cifar10_cache(cifar10_dir=None, batch_size=200, seed=0):
+    """
+    Time and measure the memory allocated by load_CIFAR10 from the pickles
+    against a cold (converting) and a warm (memory-mapped) load of the uint8
+    cache, and the float32 conversion of one minibatch drawn from the cache.
+
+    If cifar10_dir is None random images in the CIFAR-10 format are written
+    to a temporary directory. The cache is always written to a temporary
+    directory, so an existing cache next to cifar10_dir is left alone.
+
+    Returns a dictionary mapping every step to its seconds and bytes.
+    """
+    from scripts.data_utils import load_CIFAR10
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if cifar10_dir is None:
+            cifar10_dir = os.path.join(tmp_dir, 'cifar-10-batches-py')
+            os.makedirs(cifar10_dir)
+            write_fake_CIFAR10(cifar10_dir, seed=seed)
+        cache_dir = os.path.join(tmp_dir, 'cifar-10-batches-npy')
+
+        def load_cached():
+            return load_CIFAR10(cifar10_dir, dtype=None, cache=True,
+                                cache_dir=cache_dir)
+
+        def remove_cache():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        results = {}
+        loaded = {}
+        steps = [('pickle', lambda: load_CIFAR10(cifar10_dir), None),
+                 ('cold cache', load_cached, remove_cache),
+                 ('warm cache', load_cached, None)]
+        for name, load, setup in steps:
+            # Memory is measured on a separate call, since tracemalloc slows
+            # down allocations; setup() makes that call cold again.
+            if setup is not None:
+                setup()
+            nbytes = temporary_memory(load)
+            if setup is not None:
+                setup()
+            elapsed, loaded[name] = time_function(load)
+            results[name] = (elapsed, nbytes)
+            print('%s: %fs, %.1f MB allocated'
+                  % (name, elapsed, nbytes / 2.0 ** 20))
+
+        X_train = loaded['warm cache'][0]
+        idx = np.random.RandomState(seed).choice(X_train.shape[0], batch_size)
+        elapsed, X_batch = time_function(
+            lambda: X_train[idx].astype(np.float32))
+        results['batch'] = (elapsed, X_batch.nbytes)
+        print('float32 minibatch of %d from the cache: %fs'
+              % (batch_size, elapsed))
+        assert np.array_equal(loaded['pickle'][0][idx], X_batch)
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def benchmark_cifar10_stream(cifar10_dir=None, batch_size=200,
+                             shuffle_buffer=10000, num_iters=500, seed=0):
+    """
+    Compare training LinearSVM on load_CIFAR10 with training it on
+    stream_CIFAR10: the time until the first minibatch is available, the
+    peak memory allocated while training and the total time.
+
+    If cifar10_dir is None random images in the CIFAR-10 format are written
+    to a temporary directory.
+
+    Returns a dictionary mapping "load" and "stream" to their seconds to the
+    first batch, allocated bytes and total seconds.
+    """
+    from scripts.data_utils import load_CIFAR10, stream_CIFAR10
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        if cifar10_dir is None:
+            cifar10_dir = os.path.join(tmp_dir, 'cifar-10-batches-py')
+            os.makedirs(cifar10_dir)
+            write_fake_CIFAR10(cifar10_dir, seed=seed)
+
+        def flatten(X):
+            return X.reshape(X.shape[0], -1)
+
+        def first_loaded():
+            X_train, y_train, _, _ = load_CIFAR10(cifar10_dir,
+                                                  dtype=np.float32)
+            return flatten(X_train), y_train
+
+        def train_loaded():
+            X_train, y_train = first_loaded()
+            LinearSVM().train(X_train, y_train, learning_rate=1e-7,
+                              reg=2.5e4, num_iters=num_iters,
+                              batch_size=batch_size)
+
+        def make_stream():
+            return stream_CIFAR10(cifar10_dir, batch_size=batch_size,
+                                  shuffle_buffer=shuffle_buffer,
+                                  dtype=np.float32, transform=flatten,
+                                  seed=seed)
+
+        def train_streamed():
+            LinearSVM().train(None, None, learning_rate=1e-7, reg=2.5e4,
+                              num_iters=num_iters, batches=make_stream())
+
+        results = {}
+        for name, first, train in [
+                ('load', first_loaded, train_loaded),
+                ('stream', lambda: next(iter(make_stream())), train_streamed)]:
+            first_time, _ = time_function(first)
+            nbytes = temporary_memory(train)
+            np.random.seed(seed)
+            total_time, _ = time_function(train)
+            results[name] = (first_time, nbytes, total_time)
+            print('%s: first batch after %fs, %.1f MB allocated, %d '
+                  'iterations in %fs' % (name, first_time, nbytes / 2.0 ** 20,
+                                         num_iters, total_time))
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    benchmark_knn_voting()
+    benchmark_knn_parallel()
+    benchmark_knn_index()
+    benchmark_knn_cross_validation()
+    benchmark_knn_dtype()
+    benchmark_svm_loss()
+    benchmark_softmax_loss()
+    benchmark_minibatch_sampling()
+    benchmark_grid_search()
+    benchmark_model_bank()
+    benchmark_float32_training()
+    benchmark_gradient_check()
+    benchmark_cifar10_cache()
+    benchmark_cifar10_stream()
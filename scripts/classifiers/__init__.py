@@ -1,2 +1,3 @@
 from scripts.classifiers.k_nearest_neighbor import *
+from scripts.classifiers.knn_index import *
 from scripts.classifiers.linear_classifier import *
@@ -1,7 +1,15 @@
 from builtins import range
 from builtins import object
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
 from past.builtins import xrange
+from scripts.parallel import attach_array, release, share_array
+
+
+# Number of training rows that are expanded at once when the training data is
+# stored as a QuantizedArray.
+TRAIN_CHUNK = 4096
 
 
 class KNearestNeighbor(object):
@@ -11,7 +19,7 @@ class KNearestNeighbor(object):
         pass
         
 
-    def train(self, X, y):
+    def train(self, X, y, index=None, dtype=None):
         """
         Train the classifier. For k-nearest neighbors this is just
         memorizing the training data.
@@ -21,11 +29,34 @@ class KNearestNeighbor(object):
           consisting of num_train samples each of dimension D.
         - y: A numpy array of shape (N,) containing the training labels, where
              y[i] is the label for X[i].
+        - index: Optional approximate nearest neighbor index, such as
+          IVFIndex. It is built here once, and predict then queries it
+          instead of computing exact distances to every training point.
+        - dtype: Optional storage type for the training data. A floating type
+          such as np.float32 stores a cast copy. An integer type such as
+          np.uint8 or np.int8 stores a QuantizedArray with one scale per
+          feature, and distances are computed in float32. If None, X is kept
+          as passed.
         """
-        self.X_train = X
+        if dtype is not None and np.issubdtype(dtype, np.integer):
+            self.X_train = QuantizedArray(X, dtype)
+        elif dtype is not None:
+            self.X_train = X.astype(dtype)
+        else:
+            self.X_train = X
+        self.dtype = self.X_train.dtype if dtype is not None else None
         self.y_train = y
+        # Squared norms of the training rows, shared by every distance query.
+        # They are computed from the stored values, rounding included.
+        self.X_train_sq = np.concatenate(
+            [np.sum(self.X_train[start:start + TRAIN_CHUNK] ** 2, axis=1)
+             for start in range(0, max(1, X.shape[0]), TRAIN_CHUNK)])
+        self.index = index
+        if index is not None:
+            index.build(X)
 
-    def predict(self, X, k=1, num_loops=0):
+    def predict(self, X, k=1, num_loops=0, memory_budget=None, n_jobs=1,
+                backend='thread'):
         """
         Predict labels for test data using this classifier.
 
@@ -34,12 +65,38 @@ class KNearestNeighbor(object):
              of num_test samples each of dimension D.
         - k: The number of nearest neighbors that vote for the predicted labels.
         - num_loops: Determines which implementation to use to compute distances
-          between training points and testing points.
+          between training points and testing points. Ignored if the
+          classifier was trained with an index.
+        - memory_budget: If not None, stream over the data instead of building
+          the full distance matrix (see predict_streaming); the value is the
+          approximate number of bytes the distance blocks may use.
+        - n_jobs: Number of workers to split the test points across; -1 uses
+          all cores. See predict_parallel.
+        - backend: 'thread' or 'process'; the kind of pool used when n_jobs
+          is not 1.
 
         Returns:
         - y: A numpy array of shape (num_test,) containing predicted labels for the
           test data, where y[i] is the predicted label for the test point X[i].
         """
+        if self.dtype is not None:
+            # Run the distance kernels in the storage precision.
+            X = np.asarray(X, dtype=self.dtype)
+
+        if n_jobs != 1:
+            return self.predict_parallel(X, k=k, num_loops=num_loops,
+                                         memory_budget=memory_budget,
+                                         n_jobs=n_jobs, backend=backend)
+
+        if self.index is not None:
+            closest_idx, closest_dists = self.index.query(
+                X, self.X_train, self.X_train_sq, k)
+            return vote_labels(self.y_train[closest_idx],
+                               closest_dists).astype(np.float64)
+
+        if memory_budget is not None:
+            return self.predict_streaming(X, k=k, memory_budget=memory_budget)
+
         if num_loops == 0:
             dists = self.compute_distances_no_loops(X)
         elif num_loops == 1:
@@ -51,6 +108,168 @@ class KNearestNeighbor(object):
 
         return self.predict_labels(dists, k=k)
 
+    def cross_validate(self, X, y, ks, num_folds=5):
+        """
+        Estimate the accuracy of every k in ks with num_folds-fold cross
+        validation.
+
+        X and y are split into folds with np.array_split. For every fold the
+        distances to the points of all other folds are computed once, the
+        neighbours of each row are sorted once up to max(ks), and every k is
+        scored from that single ordering. Training the classifier and
+        recomputing the distances for each (k, fold) pair gives the same
+        accuracies up to ties in distance.
+
+        This does not change the data the classifier was trained on.
+
+        Inputs:
+        - X: A numpy array of shape (N, D) containing the data to split.
+        - y: A numpy array of shape (N,) containing the labels.
+        - ks: A list of the values of k to try.
+        - num_folds: The number of folds.
+
+        Returns:
+        - k_to_accuracies: A dictionary mapping every k in ks to a list of
+          num_folds accuracies, one per held-out fold.
+        """
+        num_points = X.shape[0]
+        max_k = max(ks)
+        X_sq = np.sum(X ** 2, axis=1)
+        bounds = np.cumsum([0] + [len(f) for f in np.array_split(y, num_folds)])
+        k_to_accuracies = {k: [] for k in ks}
+        for j in range(num_folds):
+            start, stop = bounds[j], bounds[j + 1]
+            dists = squared_distances(X[start:stop], X_sq[start:stop, np.newaxis],
+                                      X, X_sq)
+            # Points of the held-out fold are not neighbours of each other.
+            dists[:, start:stop] = np.inf
+            closest_idx, closest_dists = top_k_neighbors(
+                dists, min(max_k, num_points - (stop - start)))
+            order = np.argsort(closest_dists, axis=1, kind='stable')
+            closest_idx = np.take_along_axis(closest_idx, order, axis=1)
+            closest_dists = np.take_along_axis(closest_dists, order, axis=1)
+            closest_y = y[closest_idx]
+            for k in ks:
+                y_pred = vote_labels(closest_y[:, :k], closest_dists[:, :k])
+                k_to_accuracies[k].append(np.mean(y_pred == y[start:stop]))
+        return k_to_accuracies
+
+    def predict_parallel(self, X, k=1, num_loops=0, memory_budget=None,
+                         n_jobs=-1, backend='thread'):
+        """
+        Predict labels for test data with a pool of workers, each of which runs
+        the serial predict on a contiguous block of test points. Every test
+        point is classified independently, so the result is the same as for
+        n_jobs=1.
+
+        With the 'thread' backend the workers share self.X_train directly;
+        NumPy releases the GIL inside the distance kernels, so this scales for
+        num_loops=0 and the streaming mode. The pure Python num_loops=1 and
+        num_loops=2 paths need the 'process' backend, where the training data
+        is copied once into a multiprocessing shared memory block that every
+        worker maps instead of receiving a pickled copy. Quantized training
+        data is shared in its dequantized float32 form.
+
+        Inputs: Same as predict, plus:
+        - n_jobs: Number of workers; -1 uses all cores.
+        - backend: Either 'thread' or 'process'.
+
+        Returns:
+        - y: A numpy array of shape (num_test,) containing predicted labels for the
+          test data, same as predict.
+        """
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+        num_test = X.shape[0]
+        # A few blocks per worker keeps the pool busy when blocks finish at
+        # different speeds.
+        num_blocks = max(1, min(num_test, 4 * n_jobs))
+        bounds = np.linspace(0, num_test, num_blocks + 1).astype(int)
+        blocks = [X[bounds[i]:bounds[i + 1]] for i in range(num_blocks)]
+
+        if backend == 'thread':
+            def predict_block(X_block):
+                return self.predict(X_block, k=k, num_loops=num_loops,
+                                    memory_budget=memory_budget)
+
+            with ThreadPoolExecutor(n_jobs) as pool:
+                parts = list(pool.map(predict_block, blocks))
+        elif backend == 'process':
+            shm, spec = share_array(self.X_train)
+            try:
+                initargs = (spec, self.y_train, self.index)
+                with ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                                         initargs=initargs) as pool:
+                    parts = list(pool.map(
+                        _predict_block, blocks, [k] * num_blocks,
+                        [num_loops] * num_blocks,
+                        [memory_budget] * num_blocks))
+            finally:
+                release(shm)
+        else:
+            raise ValueError('Invalid backend "%s"' % backend)
+
+        return np.concatenate(parts)
+
+    def predict_streaming(self, X, k=1, memory_budget=64 * 2 ** 20):
+        """
+        Predict labels for test data without materialising the full
+        (num_test, num_train) distance matrix.
+
+        Test rows are processed in blocks and the training set is scanned in
+        chunks; only a running buffer of the k smallest (distance, index) pairs
+        is kept for each test row of the current block. Block sizes are chosen
+        so that the temporaries of one (test block, train chunk) step fit into
+        memory_budget bytes, so peak memory does not grow with num_test.
+
+        Inputs:
+        - X: A numpy array of shape (num_test, D) containing test data.
+        - k: The number of nearest neighbors that vote for the predicted labels.
+        - memory_budget: Approximate number of bytes for the distance blocks.
+
+        Returns:
+        - y: A numpy array of shape (num_test,) containing predicted labels for the
+          test data, same as predict.
+        """
+        num_test = X.shape[0]
+        num_train = self.X_train.shape[0]
+        k = min(k, num_train)
+        # A distance block, its merge with the top-k buffer and the
+        # argpartition indices each take one word per element.
+        cells = max(1, memory_budget // (3 * np.dtype(np.float64).itemsize))
+        train_block = min(num_train, cells)
+        test_block = max(1, cells // train_block)
+
+        y_pred = np.zeros(num_test)
+        for start in range(0, num_test, test_block):
+            stop = min(start + test_block, num_test)
+            closest_idx, closest_dists = self._streaming_top_k(
+                X[start:stop], k, train_block)
+            y_pred[start:stop] = vote_labels(self.y_train[closest_idx],
+                                             closest_dists)
+        return y_pred
+
+    def _streaming_top_k(self, X, k, train_block):
+        """
+        Find the k nearest training points of every row of X by scanning the
+        training set in chunks of train_block rows.
+
+        Returns a tuple (closest_idx, closest_dists) of arrays of shape
+        (num_test, k) as in top_k_neighbors; the distances are squared.
+        """
+        num_test = X.shape[0]
+        num_train = self.X_train.shape[0]
+        X_sq = np.sum(X ** 2, axis=1)[:, np.newaxis]
+        best_dists = np.full((num_test, k), np.inf)
+        best_idx = np.zeros((num_test, k), dtype=np.intp)
+        for start in range(0, num_train, train_block):
+            stop = min(start + train_block, num_train)
+            dists = squared_distances(X, X_sq, self.X_train[start:stop],
+                                      self.X_train_sq[start:stop])
+            best_idx, best_dists = merge_top_k(best_idx, best_dists,
+                                               np.arange(start, stop), dists)
+        return best_idx, best_dists
+
     def compute_distances_two_loops(self, X):
         """
         Compute the distance between each test point in X and each training point
@@ -93,6 +312,8 @@ class KNearestNeighbor(object):
         num_test = X.shape[0]
         num_train = self.X_train.shape[0]
         dists = np.zeros((num_test, num_train))
+        # Dequantize a QuantizedArray once rather than for every test point.
+        X_train = np.asarray(self.X_train)
         for i in range(num_test):
             #######################################################################
             # TODO:                                                               #
@@ -102,7 +323,7 @@ class KNearestNeighbor(object):
             #######################################################################
             # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-            dists[i,:] = np.sqrt(np.sum(np.square(X[i,:]-self.X_train)))
+            dists[i,:] = np.sqrt(np.sum(np.square(X[i,:]-X_train)))
 
             # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
         return dists
@@ -132,7 +353,18 @@ class KNearestNeighbor(object):
         #########################################################################
         # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-        dists = np.sqrt((X**2).sum(axis=1)[:, np.newaxis] + (self.X_train**2).sum(axis=1) - 2 * X.dot(self.X_train.T))
+        # The training rows are used TRAIN_CHUNK at a time, so quantized
+        # training data is only dequantized one chunk at a time. Integer
+        # inputs still give floating distances, as np.sqrt is taken in place.
+        X_sq = (X**2).sum(axis=1)[:, np.newaxis]
+        dists = np.empty((num_test, num_train),
+                         dtype=np.result_type(X.dtype, self.X_train.dtype,
+                                              np.float32))
+        for start in range(0, num_train, TRAIN_CHUNK):
+            stop = min(start + TRAIN_CHUNK, num_train)
+            dists[:, start:stop] = squared_distances(
+                X, X_sq, self.X_train[start:stop], self.X_train_sq[start:stop])
+        dists = np.sqrt(dists, out=dists)
 
         # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
         return dists
@@ -142,6 +374,15 @@ class KNearestNeighbor(object):
         Given a matrix of distances between test points and training points,
         predict a label for each test point.
 
+        The k nearest neighbours of every row are selected at once with
+        np.argpartition and their votes are counted in a (num_test, num_classes)
+        histogram, so there is no Python loop over the test points. Ties are
+        broken deterministically: if every label among the k neighbours got the
+        same number of votes the label of the nearest neighbour wins, otherwise
+        the smallest of the most voted labels wins. predict_labels_loop follows
+        the same rule except that it orders tied labels by Python set iteration
+        order, so the two can disagree on such ties once labels reach 8.
+
         Inputs:
         - dists: A numpy array of shape (num_test, num_train) where dists[i, j]
           gives the distance betwen the ith test point and the jth training point.
@@ -152,6 +393,21 @@ class KNearestNeighbor(object):
         """
         num_test = dists.shape[0]
         y_pred = np.zeros(num_test)
+        if num_test == 0:
+            return y_pred
+        closest_idx, closest_dists = top_k_neighbors(dists, k)
+        y_pred[:] = vote_labels(self.y_train[closest_idx], closest_dists)
+        return y_pred
+
+    def predict_labels_loop(self, dists, k=1):
+        """
+        Reference implementation of predict_labels with a loop over the test
+        points.
+
+        Input / Output: Same as predict_labels
+        """
+        num_test = dists.shape[0]
+        y_pred = np.zeros(num_test)
         for i in range(num_test):
             
             closest_y = []
@@ -184,13 +440,170 @@ class KNearestNeighbor(object):
             # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
         return y_pred
-    
-    
-    
-    
-    
-    
-    
-    
-    
-    
+
+
+class QuantizedArray(object):
+    """
+    A (num_train, D) array stored as 8-bit integers with an affine scale per
+    feature: x[:, d] ~= q[:, d] * scale[d] + offset[d]. The range of every
+    feature is mapped onto the full integer range, so uint8 pixel data is
+    stored without loss.
+
+    Indexing returns dequantized float32 values, so blocks of rows can be
+    used by the distance kernels directly while only the 8-bit codes stay in
+    memory.
+    """
+
+    def __init__(self, X, dtype=np.uint8):
+        info = np.iinfo(dtype)
+        lo = X.min(axis=0).astype(np.float32)
+        hi = X.max(axis=0).astype(np.float32)
+        scale = (hi - lo) / (int(info.max) - int(info.min))
+        scale[scale == 0] = 1
+        self.scale = scale
+        self.offset = lo - info.min * scale
+        q = np.rint((X - self.offset) / self.scale)
+        self.q = np.clip(q, info.min, info.max).astype(dtype)
+        self.shape = self.q.shape
+        self.dtype = np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.q.nbytes + self.scale.nbytes + self.offset.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        cols = key[1] if len(key) > 1 else slice(None)
+        values = self.q[key].astype(self.dtype)
+        values *= self.scale[cols]
+        values += self.offset[cols]
+        return values
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[:]
+        return values if dtype is None else values.astype(dtype)
+
+
+# Per-process classifier used by the 'process' backend of predict_parallel.
+_worker = {}
+
+
+def _init_worker(spec, y_train, index):
+    shm, X_train = attach_array(spec)
+    classifier = KNearestNeighbor()
+    classifier.train(X_train, y_train)
+    # The index arrives already built; only attach it.
+    classifier.index = index
+    _worker['shm'] = shm
+    _worker['classifier'] = classifier
+
+
+def _predict_block(X, k, num_loops, memory_budget):
+    return _worker['classifier'].predict(X, k=k, num_loops=num_loops,
+                                         memory_budget=memory_budget)
+
+
+def top_k_neighbors(dists, k):
+    """
+    Select the k smallest distances of every row of dists.
+
+    Inputs:
+    - dists: A numpy array of shape (num_test, num_train).
+    - k: The number of neighbors to keep; clipped to num_train.
+
+    Returns a tuple of:
+    - closest_idx: Integer array of shape (num_test, k) with the column indices
+      of the k nearest training points, in no particular order.
+    - closest_dists: Array of shape (num_test, k) with the matching distances.
+    """
+    num_train = dists.shape[1]
+    k = min(k, num_train)
+    if k < num_train:
+        closest_idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+    else:
+        closest_idx = np.broadcast_to(np.arange(num_train), dists.shape)
+    closest_dists = np.take_along_axis(dists, closest_idx, axis=1)
+    return closest_idx, closest_dists
+
+
+def squared_distances(X, X_sq, X_train, X_train_sq):
+    """
+    Squared L2 distances between the rows of X and the rows of X_train.
+
+    Inputs:
+    - X: A numpy array of shape (num_test, D).
+    - X_sq: Squared norms of the rows of X, of shape (num_test, 1).
+    - X_train: A numpy array of shape (num_train, D).
+    - X_train_sq: Squared norms of the rows of X_train, of shape (num_train,).
+
+    Returns:
+    - dists: A numpy array of shape (num_test, num_train).
+    """
+    dists = X.dot(np.asarray(X_train).T)
+    dists *= -2
+    dists += X_sq
+    dists += X_train_sq
+    return dists
+
+
+def merge_top_k(best_idx, best_dists, cand_idx, cand_dists):
+    """
+    Merge a block of candidate neighbors into running top-k buffers.
+
+    Inputs:
+    - best_idx: Integer array of shape (num_test, k) with the training indices
+      currently kept for every test point.
+    - best_dists: Array of shape (num_test, k) with the matching distances;
+      empty slots hold np.inf.
+    - cand_idx: Integer array of shape (num_cand,) giving the training index of
+      every column of cand_dists.
+    - cand_dists: Array of shape (num_test, num_cand) of candidate distances.
+
+    Returns a tuple of the updated (best_idx, best_dists).
+    """
+    k = best_idx.shape[1]
+    # Columns < k of the candidates are the buffer, the rest are cand_idx.
+    candidates = np.hstack([best_dists, cand_dists])
+    idx, best_dists = top_k_neighbors(candidates, k)
+    del candidates
+    from_buffer = np.take_along_axis(best_idx, np.minimum(idx, k - 1), axis=1)
+    from_block = cand_idx[np.maximum(idx - k, 0)]
+    best_idx = np.where(idx < k, from_buffer, from_block)
+    return best_idx, best_dists
+
+
+def vote_labels(closest_y, closest_dists):
+    """
+    Majority vote over the labels of the nearest neighbors of each test point.
+
+    Inputs:
+    - closest_y: Integer array of shape (num_test, k) with the labels of the k
+      nearest neighbors of every test point.
+    - closest_dists: Array of shape (num_test, k) with the matching distances;
+      only used to find the nearest neighbor when all labels are tied.
+
+    Returns:
+    - y: Array of shape (num_test,) with the winning label of every row.
+    """
+    num_test, k = closest_y.shape
+    closest_y = closest_y.astype(np.intp)
+    num_classes = closest_y.max() + 1
+    rows = np.arange(num_test)
+
+    # One bincount over row-offset labels builds the whole vote histogram.
+    flat = (rows[:, np.newaxis] * num_classes + closest_y).ravel()
+    counts = np.bincount(flat, minlength=num_test * num_classes)
+    counts = counts.reshape(num_test, num_classes)
+
+    # argmax returns the smallest label among the most voted ones.
+    majority = counts.argmax(axis=1)
+    max_count = counts[rows, majority]
+    num_voted = np.count_nonzero(counts, axis=1)
+    all_tied = num_voted * max_count == k
+
+    nearest = closest_y[rows, closest_dists.argmin(axis=1)]
+    return np.where(all_tied, nearest, majority)
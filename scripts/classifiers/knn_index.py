@@ -0,0 +1,132 @@
+from builtins import range
+from builtins import object
+import numpy as np
+
+from scripts.classifiers.k_nearest_neighbor import (merge_top_k,
+                                                    squared_distances,
+                                                    top_k_neighbors)
+
+
+class IVFIndex(object):
+    """
+    An approximate nearest neighbor index for KNearestNeighbor based on an
+    inverted file (IVF) with a k-means coarse quantizer.
+
+    build() clusters the training points into num_lists cells and keeps, for
+    every cell, the indices of the training points closest to its centroid.
+    query() compares every test point only with the points of its num_probe
+    nearest cells. num_probe is the recall/latency knob: num_probe=num_lists
+    is an exact search, smaller values scan a fraction of roughly
+    num_probe / num_lists of the training set.
+
+    The index only stores the cell structure; the training data itself is
+    passed to query(), so the classifier keeps a single copy of it.
+
+    Any object with the same build(X_train) and
+    query(X, X_train, X_train_sq, k) methods can be passed to
+    KNearestNeighbor.train as an index.
+    """
+
+    def __init__(self, num_lists=64, num_probe=8, num_iters=10,
+                 sample_size=256, seed=0):
+        """
+        Inputs:
+        - num_lists: Number of cells of the coarse quantizer.
+        - num_probe: Number of cells scanned for every query.
+        - num_iters: Number of k-means iterations used to place the centroids.
+        - sample_size: Number of training points per cell used to fit k-means.
+        - seed: Seed for the random initialisation of k-means.
+        """
+        self.num_lists = num_lists
+        self.num_probe = num_probe
+        self.num_iters = num_iters
+        self.sample_size = sample_size
+        self.seed = seed
+
+    def build(self, X_train):
+        """
+        Fit the coarse quantizer and assign every training point to a cell.
+
+        Inputs:
+        - X_train: A numpy array of shape (num_train, D).
+        """
+        num_train = X_train.shape[0]
+        num_lists = min(self.num_lists, num_train)
+        rng = np.random.RandomState(self.seed)
+
+        num_sample = min(num_train, self.sample_size * num_lists)
+        sample = X_train[rng.choice(num_train, num_sample, replace=False)]
+        centroids = sample[rng.choice(num_sample, num_lists, replace=False)]
+        for _ in range(self.num_iters):
+            assign = self._nearest_centroid(sample, centroids)
+            # Cluster sums as one GEMM with the one-hot assignment matrix.
+            one_hot = np.zeros((num_sample, num_lists), dtype=sample.dtype)
+            one_hot[np.arange(num_sample), assign] = 1
+            counts = np.bincount(assign, minlength=num_lists)
+            sums = one_hot.T.dot(sample)
+            nonempty = counts > 0
+            centroids = centroids.copy()
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, np.newaxis]
+
+        assign = self._nearest_centroid(X_train, centroids)
+        self.centroids = centroids
+        self.centroids_sq = np.sum(centroids ** 2, axis=1)
+        self.order = np.argsort(assign, kind='stable')
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=num_lists))])
+
+    def query(self, X, X_train, X_train_sq, k):
+        """
+        Find approximate k nearest training points for every row of X.
+
+        Inputs:
+        - X: A numpy array of shape (num_test, D) containing test data.
+        - X_train: The training data the index was built on.
+        - X_train_sq: Squared norms of the rows of X_train.
+        - k: The number of neighbors to return.
+
+        Returns a tuple (closest_idx, closest_dists) of arrays of shape
+        (num_test, k) as in top_k_neighbors; the distances are squared.
+        """
+        num_test = X.shape[0]
+        num_lists = self.centroids.shape[0]
+        k = min(k, X_train.shape[0])
+        num_probe = max(1, min(self.num_probe, num_lists))
+
+        X_sq = np.sum(X ** 2, axis=1)[:, np.newaxis]
+        centroid_dists = squared_distances(X, X_sq, self.centroids,
+                                           self.centroids_sq)
+        probes, _ = top_k_neighbors(centroid_dists, num_probe)
+
+        # Invert the probe table: the test rows that scan each cell.
+        flat = probes.ravel()
+        by_list = np.argsort(flat, kind='stable') // num_probe
+        list_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(flat, minlength=num_lists))])
+
+        best_dists = np.full((num_test, k), np.inf)
+        best_idx = np.zeros((num_test, k), dtype=np.intp)
+        for l in range(num_lists):
+            rows = by_list[list_offsets[l]:list_offsets[l + 1]]
+            members = self.order[self.offsets[l]:self.offsets[l + 1]]
+            if rows.size == 0 or members.size == 0:
+                continue
+            dists = squared_distances(X[rows], X_sq[rows], X_train[members],
+                                      X_train_sq[members])
+            best_idx[rows], best_dists[rows] = merge_top_k(
+                best_idx[rows], best_dists[rows], members, dists)
+
+        # Points whose probed cells hold fewer than k training points fall
+        # back to an exact search.
+        short = np.nonzero(np.isinf(best_dists).any(axis=1))[0]
+        if short.size > 0:
+            dists = squared_distances(X[short], X_sq[short], X_train,
+                                      X_train_sq)
+            best_idx[short], best_dists[short] = top_k_neighbors(dists, k)
+        return best_idx, best_dists
+
+    def _nearest_centroid(self, X, centroids):
+        X_sq = np.sum(X ** 2, axis=1)[:, np.newaxis]
+        dists = squared_distances(X, X_sq, centroids,
+                                  np.sum(centroids ** 2, axis=1))
+        return np.argmin(dists, axis=1)
@@ -2,19 +2,34 @@ from __future__ import print_function
 
 from builtins import range
 from builtins import object
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from scripts.classifiers.linear_svm import *
 from scripts.classifiers.softmax import *
+from scripts.minibatch import EpochBatcher
+from scripts.parallel import attach_array, release, share_array
 from past.builtins import xrange
 
 
 class LinearClassifier(object):
 
-    def __init__(self):
+    def __init__(self, dtype=None):
+        """
+        Inputs:
+        - dtype: numpy datatype of the weights and of the computation. If
+          None, the floating type of the training data is used (float64 for
+          integer data), so float32 data trains in float32 throughout.
+        """
         self.W = None
+        self.dtype = dtype
+        # Scratch buffers reused by loss functions that accept a cache.
+        self.loss_cache = {}
 
     def train(self, X, y, learning_rate=1e-3, reg=1e-5, num_iters=100,
-              batch_size=200, verbose=False):
+              batch_size=None, verbose=False, epoch_mode=False,
+              early_stopping=None, X_val=None, y_val=None, batches=None):
         """
         Train this linear classifier using stochastic gradient descent.
 
@@ -26,19 +41,63 @@ class LinearClassifier(object):
         - learning_rate: (float) learning rate for optimization.
         - reg: (float) regularization strength.
         - num_iters: (integer) number of steps to take when optimizing
-        - batch_size: (integer) number of training examples to use at each step.
+        - batch_size: (integer) number of training examples to use at each step;
+          200 if None.
         - verbose: (boolean) If true, print progress during optimization.
+        - epoch_mode: (boolean) If true, draw minibatches without replacement
+          as contiguous slices of a copy of X shuffled once per epoch (see
+          EpochBatcher) instead of sampling each one with np.random.choice.
+        - early_stopping: An optional EarlyStopping monitor. Training stops
+          once it reports convergence, and the weights of its best check are
+          restored at the end.
+        - X_val, y_val: Validation data and labels; only needed by an
+          EarlyStopping monitor with metric='val_acc', which raises a
+          ValueError without them.
+        - batches: Optional iterable of (X_batch, y_batch) minibatches with a
+          num_classes attribute, such as a BatchStream from data_utils, to
+          train on instead of X and y. The minibatches then set the batch
+          size, so X, y and batch_size must be None and epoch_mode False;
+          anything else raises a ValueError. num_iters still counts steps:
+          batches is iterated again whenever a pass ends before num_iters.
 
         Outputs:
-        A list containing the value of the loss function at each training iteration.
+        A list containing the value of the loss function at each training
+        iteration; it is shorter than num_iters if training stopped early.
         """
-        num_train, dim = X.shape
-        num_classes = np.max(y) + 1 
+        if (early_stopping is not None and early_stopping.metric == 'val_acc'
+                and (X_val is None or y_val is None)):
+            raise ValueError("metric 'val_acc' needs X_val and y_val")
+        batch_iter = None
+        if batches is not None:
+            if X is not None or y is not None:
+                raise ValueError('X and y must be None when batches is given')
+            if batch_size is not None:
+                raise ValueError('batch_size must be None when batches is given')
+            if epoch_mode:
+                raise ValueError('epoch_mode cannot be used with batches')
+            batch_iter = _repeat_batches(batches)
+            X_first, y_first = next(batch_iter)
+            batch_iter = itertools.chain([(X_first, y_first)], batch_iter)
+            dim = X_first.shape[1]
+            num_classes = batches.num_classes
+            dtype = _compute_dtype(self.dtype, X_first)
+        else:
+            if batch_size is None:
+                batch_size = 200
+            num_train, dim = X.shape
+            num_classes = np.max(y) + 1 
+            dtype = _compute_dtype(self.dtype, X)
         if self.W is None:
             
-            self.W = 0.001 * np.random.randn(dim, num_classes)
+            self.W = (0.001 * np.random.randn(dim, num_classes)).astype(dtype)
 
         
+        batcher = None
+        if epoch_mode:
+            batcher = EpochBatcher(X, y, batch_size)
+        if early_stopping is not None:
+            early_stopping.reset()
+
         loss_history = []
         for it in range(num_iters):
             X_batch = None
@@ -57,14 +116,20 @@ class LinearClassifier(object):
             #########################################################################
             # *****START OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-            batch_ix = np.random.choice(num_train, batch_size, replace = True)
-            X_batch = X[batch_ix]
-            y_batch = y[batch_ix]
+            if batch_iter is not None:
+                X_batch, y_batch = next(batch_iter)
+            elif batcher is not None:
+                X_batch, y_batch = batcher.next_batch()
+            else:
+                batch_ix = np.random.choice(num_train, batch_size, replace = True)
+                X_batch = X[batch_ix]
+                y_batch = y[batch_ix]
 
             # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
-            
-            loss, grad = self.loss(X_batch, y_batch, reg)
+            # Keep the loss in the weights' precision; a no-op if X matches.
+            X_batch = X_batch.astype(self.W.dtype, copy=False)
+            loss, grad = self.loss(X_batch, y_batch, reg, fused=True)
             loss_history.append(loss)
 
             # perform parameter update
@@ -81,8 +146,158 @@ class LinearClassifier(object):
             if verbose and it % 100 == 0:
                 print('iteration %d / %d: loss %f' % (it, num_iters, loss))
 
+            if early_stopping is not None:
+                early_stopping.add_loss(loss)
+                if early_stopping.should_check(it):
+                    val_acc = None
+                    if early_stopping.metric == 'val_acc':
+                        val_acc = np.mean(self.predict(X_val) == y_val)
+                    if early_stopping.update(it, self.W, val_acc=val_acc):
+                        if verbose:
+                            print('converged at iteration %d / %d'
+                                  % (it, num_iters))
+                        break
+
+        if batcher is not None:
+            batcher.close()
+        if early_stopping is not None and early_stopping.best_params is not None:
+            self.W = early_stopping.best_params
         return loss_history
 
+    @classmethod
+    def train_bank(cls, X, y, learning_rates, regs, num_iters=100,
+                   batch_size=200, verbose=False, dtype=None):
+        """
+        Train a bank of M independent classifiers, one per (learning_rate,
+        reg) pair, with stochastic gradient descent on shared minibatches.
+
+        The weights of all models are stacked side by side into one (D, M * C)
+        matrix, so every step computes the scores of all of them with one
+        matrix multiply (see loss_bank) instead of M skinny ones. Each model
+        still has its own learning rate and regularization strength.
+
+        Inputs:
+        - X, y: Training data and labels, as for train.
+        - learning_rates: A sequence of M learning rates.
+        - regs: A sequence of M regularization strengths, one per learning
+          rate.
+        - num_iters, batch_size, verbose: As for train.
+        - dtype: As for the constructor.
+
+        Returns a tuple of:
+        - models: A list of M trained instances of this class.
+        - loss_history: A numpy array of shape (num_iters, M) with the loss of
+          every model at each iteration.
+        """
+        num_train, dim = X.shape
+        num_classes = np.max(y) + 1
+        dtype = _compute_dtype(dtype, X)
+        learning_rates = np.asarray(learning_rates, dtype=dtype)
+        regs = np.asarray(regs, dtype=dtype)
+        num_models = len(learning_rates)
+        bank = cls(dtype=dtype)
+
+        W = [0.001 * np.random.randn(dim, num_classes) for _ in range(num_models)]
+        W = np.stack(W, axis=1).reshape(dim, num_models * num_classes)
+        W = W.astype(dtype)
+        # Per-column learning rates, so the update is one broadcast.
+        column_rates = np.repeat(learning_rates, num_classes)
+
+        loss_history = np.zeros((num_iters, num_models))
+        for it in range(num_iters):
+            batch_ix = np.random.choice(num_train, batch_size, replace=True)
+            X_batch = X[batch_ix].astype(dtype, copy=False)
+            losses, grad = bank.loss_bank(W, X_batch, y[batch_ix], regs)
+            loss_history[it] = losses
+            grad *= column_rates
+            W -= grad
+
+            if verbose and it % 100 == 0:
+                print('iteration %d / %d: loss %s' % (it, num_iters, losses))
+
+        models = []
+        for m in range(num_models):
+            model = cls(dtype=dtype)
+            model.W = W[:, m * num_classes:(m + 1) * num_classes].copy()
+            models.append(model)
+        return models, loss_history
+
+    @classmethod
+    def grid_search(cls, X, y, X_val, y_val, grid, n_jobs=-1, verbose=True):
+        """
+        Train one fresh classifier per combination of hyperparameters and pick
+        the one with the best validation accuracy.
+
+        Every configuration trains its own instance, so no weights leak from
+        one run to the next. With n_jobs != 1 the runs are spread over a
+        process pool; the training and validation data are placed in shared
+        memory once and mapped by every worker instead of being pickled for
+        each run. Results are reported as soon as each run finishes.
+
+        Every run gets a seed drawn from the global np.random state, so the
+        results do not depend on n_jobs and np.random.seed makes them
+        repeatable.
+
+        Inputs:
+        - X, y: Training data and labels, as for train.
+        - X_val, y_val: Validation data and labels.
+        - grid: A dictionary mapping names of train arguments (for example
+          'learning_rate' and 'reg') to lists of values to try; every
+          combination is trained.
+        - n_jobs: Number of worker processes; -1 uses all cores and 1 trains
+          in this process.
+        - verbose: If true, print the accuracies of every run as it finishes.
+
+        Returns a tuple of:
+        - best_model: The trained instance with the best validation accuracy.
+        - results: A dictionary mapping tuples of hyperparameter values, in
+          the order of grid's keys, to (train_accuracy, val_accuracy).
+        """
+        names = list(grid.keys())
+        configs = list(itertools.product(*[grid[name] for name in names]))
+        seeds = np.random.randint(2 ** 31 - 1, size=len(configs))
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+
+        results = {}
+        weights = {}
+
+        def collect(config, W, train_acc, val_acc):
+            results[config] = (train_acc, val_acc)
+            weights[config] = W
+            if verbose:
+                print('%s train accuracy: %f val accuracy: %f'
+                      % (', '.join('%s %s' % pair for pair in zip(names, config)),
+                         train_acc, val_acc))
+
+        def best():
+            # Ties go to the earliest configuration, whatever finished first.
+            config = max(configs, key=lambda c: results[c][1])
+            best_model = cls(dtype=weights[config].dtype)
+            best_model.W = weights[config]
+            return best_model
+
+        if n_jobs == 1:
+            data = (X, y, X_val, y_val)
+            for config, seed in zip(configs, seeds):
+                collect(config, *_train_config(cls, data, names, config, seed))
+            return best(), results
+
+        shared = [share_array(a) for a in (X, y, X_val, y_val)]
+        try:
+            specs = [spec for _, spec in shared]
+            with ProcessPoolExecutor(n_jobs, initializer=_init_grid_worker,
+                                     initargs=(specs,)) as pool:
+                futures = {pool.submit(_grid_search_run, cls, names, config,
+                                       seed): config
+                           for config, seed in zip(configs, seeds)}
+                for future in as_completed(futures):
+                    collect(futures[future], *future.result())
+        finally:
+            for shm, _ in shared:
+                release(shm)
+        return best(), results
+
     def predict(self, X):
         """
         Use the trained weights of this linear classifier to predict labels for
@@ -110,7 +325,7 @@ class LinearClassifier(object):
         # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
         return y_pred
 
-    def loss(self, X_batch, y_batch, reg):
+    def loss(self, X_batch, y_batch, reg, fused=False):
         """
         Compute the loss function and its derivative.
         Subclasses will override this.
@@ -120,6 +335,10 @@ class LinearClassifier(object):
           data points; each point has dimension D.
         - y_batch: A numpy array of shape (N,) containing labels for the minibatch.
         - reg: (float) regularization strength.
+        - fused: If True, use the fused loss function. It gives the same results
+          but returns the gradient in a scratch buffer of self.loss_cache that
+          the next call overwrites; train uses it, as it applies every gradient
+          before the next call.
 
         Returns: A tuple containing:
         - loss as a single float
@@ -127,16 +346,86 @@ class LinearClassifier(object):
         """
         pass
 
+    def loss_bank(self, W, X_batch, y_batch, regs):
+        """
+        Compute the losses and gradient of a bank of M models stacked into W,
+        as used by train_bank. Subclasses will override this.
+
+        Inputs:
+        - W: A numpy array of shape (D, M * C) with the weights of all models.
+        - X_batch, y_batch: As for loss.
+        - regs: A numpy array of shape (M,) of regularization strengths.
+
+        Returns: A tuple containing:
+        - losses as a numpy array of shape (M,)
+        - gradient with respect to W; an array of the same shape as W
+        """
+        pass
+
 
 class LinearSVM(LinearClassifier):
     """ A subclass that uses the Multiclass SVM loss function """
 
-    def loss(self, X_batch, y_batch, reg):
+    def loss(self, X_batch, y_batch, reg, fused=False):
+        if fused:
+            return svm_loss_fused(self.W, X_batch, y_batch, reg,
+                                  self.loss_cache)
         return svm_loss_vectorized(self.W, X_batch, y_batch, reg)
 
+    def loss_bank(self, W, X_batch, y_batch, regs):
+        return svm_loss_bank(W, X_batch, y_batch, regs)
+
 
 class Softmax(LinearClassifier):
     """ A subclass that uses the Softmax + Cross-entropy loss function """
 
-    def loss(self, X_batch, y_batch, reg):
+    def loss(self, X_batch, y_batch, reg, fused=False):
+        if fused:
+            return softmax_loss_fused(self.W, X_batch, y_batch, reg,
+                                      self.loss_cache)
         return softmax_loss_vectorized(self.W, X_batch, y_batch, reg)
+
+    def loss_bank(self, W, X_batch, y_batch, regs):
+        return softmax_loss_bank(W, X_batch, y_batch, regs)
+
+
+def _repeat_batches(batches):
+    while True:
+        empty = True
+        for batch in batches:
+            empty = False
+            yield batch
+        if empty:
+            raise ValueError('No minibatches in batches')
+
+
+def _compute_dtype(dtype, X):
+    if dtype is not None:
+        return np.dtype(dtype)
+    if np.issubdtype(X.dtype, np.floating):
+        return X.dtype
+    return np.dtype(np.float64)
+
+
+def _train_config(cls, data, names, config, seed):
+    X, y, X_val, y_val = data
+    np.random.seed(seed)
+    model = cls()
+    model.train(X, y, **dict(zip(names, config)))
+    train_acc = np.mean(model.predict(X) == y)
+    val_acc = np.mean(model.predict(X_val) == y_val)
+    return model.W, train_acc, val_acc
+
+
+# Shared training and validation data of a grid_search worker process.
+_grid_worker = {}
+
+
+def _init_grid_worker(specs):
+    attached = [attach_array(spec) for spec in specs]
+    _grid_worker['shms'] = [shm for shm, _ in attached]
+    _grid_worker['data'] = tuple(a for _, a in attached)
+
+
+def _grid_search_run(cls, names, config, seed):
+    return _train_config(cls, _grid_worker['data'], names, config, seed)
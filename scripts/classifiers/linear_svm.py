@@ -87,3 +87,112 @@ def svm_loss_vectorized(W, X, y, reg):
     # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
     return loss, dW
+
+
+def svm_loss_fused(W, X, y, reg, cache=None):
+    """
+    Structured SVM loss function, vectorized implementation that reuses its
+    scratch buffers between calls.
+
+    All (N, C) work happens in place in buffers kept in the cache dictionary,
+    which is reused as long as the batch shape and dtype stay the same. The
+    returned gradient is one of those buffers, so it is overwritten by the
+    next call with the same cache.
+
+    Inputs are the same as svm_loss_naive, plus:
+    - cache: A dictionary holding the scratch buffers; pass the same dict on
+      every call to avoid allocating them again. If None, a new one is used.
+
+    Returns a tuple of:
+    - loss as single float
+    - gradient with respect to weights W; an array of same shape as W
+    """
+    if cache is None:
+        cache = {}
+    num_train = X.shape[0]
+    num_classes = W.shape[1]
+    dtype = np.result_type(X, W)
+    key = (num_train, W.shape, dtype)
+    if cache.get('key') != key:
+        cache['key'] = key
+        cache['scores'] = np.empty((num_train, num_classes), dtype=dtype)
+        cache['mask'] = np.empty((num_train, num_classes), dtype=bool)
+        cache['correct'] = np.empty(num_train, dtype=dtype)
+        cache['flat_y'] = np.empty(num_train, dtype=np.intp)
+        cache['row_offsets'] = np.arange(num_train) * num_classes
+        cache['reg_grad'] = np.empty(W.shape, dtype=dtype)
+        cache['dW'] = np.empty(W.shape, dtype=dtype)
+    scores = cache['scores']
+    mask = cache['mask']
+    correct = cache['correct']
+    flat_y = cache['flat_y']
+    reg_grad = cache['reg_grad']
+    dW = cache['dW']
+
+    # Flat positions of the correct classes in scores.
+    np.add(cache['row_offsets'], y, out=flat_y)
+
+    # Margins, computed in place over the scores.
+    np.dot(X, W, out=scores)
+    np.take(scores, flat_y, out=correct)
+    scores -= correct[:, np.newaxis]
+    scores += 1.0  # note delta = 1
+    np.maximum(scores, 0.0, out=scores)
+    np.put(scores, flat_y, 0.0)
+    loss = np.sum(scores) / num_train + reg * np.vdot(W, W)
+
+    # Turn the margins into the coefficients of X in the gradient: 1 for
+    # every positive margin, minus their count for the correct class, all
+    # scaled by 1 / num_train.
+    np.greater(scores, 0.0, out=mask)
+    np.copyto(scores, mask)
+    np.sum(scores, axis=1, out=correct)
+    np.negative(correct, out=correct)
+    np.put(scores, flat_y, correct)
+    scores *= 1.0 / num_train
+
+    np.dot(X.T, scores, out=dW)
+    np.multiply(W, reg, out=reg_grad)
+    dW += reg_grad
+
+    return loss, dW
+
+
+def svm_loss_bank(W, X, y, reg):
+    """
+    Structured SVM loss function for a bank of M linear models evaluated on
+    the same minibatch with a single matrix multiply.
+
+    Inputs:
+    - W: A numpy array of shape (D, M * C); columns m * C:(m + 1) * C hold
+      the weights of model m.
+    - X: A numpy array of shape (N, D) containing a minibatch of data.
+    - y: A numpy array of shape (N,) containing training labels.
+    - reg: A numpy array of shape (M,) with the regularization strength of
+      every model.
+
+    Returns a tuple of:
+    - losses: A numpy array of shape (M,) with the loss of every model
+    - gradient with respect to W; an array of same shape as W
+    """
+    num_train, dim = X.shape
+    num_models = reg.shape[0]
+    num_classes = W.shape[1] // num_models
+    rows = np.arange(num_train)
+
+    scores = X.dot(W).reshape(num_train, num_models, num_classes)
+    correct_class_scores = scores[rows, :, y]
+    margins = np.maximum(0.0, scores - correct_class_scores[:, :, np.newaxis] + 1.0)
+    margins[rows, :, y] = 0.0
+    W_models = W.reshape(dim, num_models, num_classes)
+    reg = reg.astype(W.dtype, copy=False)
+    losses = (np.sum(margins, axis=(0, 2)) / num_train
+              + reg * np.sum(W_models * W_models, axis=(0, 2)))
+
+    margins = (margins > 0).astype(W.dtype)
+    margins[rows, :, y] = -np.sum(margins, axis=2)
+    margins = margins.reshape(num_train, -1)
+    dW = X.T.dot(margins) / num_train
+    dW += (W_models * reg[:, np.newaxis]).reshape(dim, -1)
+
+    return losses, dW
@@ -99,3 +99,110 @@ def softmax_loss_vectorized(W, X, y, reg):
     # *****END OF YOUR CODE (DO NOT DELETE/MODIFY THIS LINE)*****
 
     return loss, dW
+
+
+def softmax_loss_fused(W, X, y, reg, cache=None, return_per_sample=False):
+    """
+    Softmax loss function, vectorized version that computes the exponentials
+    once and reuses its scratch buffers between calls.
+
+    The scores are shifted by their row maximum and exponentiated in place;
+    the same array gives the log-sum-exp for the loss and, once normalised,
+    the probabilities for the gradient. Buffers live in the cache dictionary
+    and are reused while the batch shape and dtype stay the same, so with
+    float32 W and X the whole computation stays in float32. The returned
+    arrays are cache buffers and are overwritten by the next call.
+
+    Inputs are the same as softmax_loss_naive, plus:
+    - cache: A dictionary holding the scratch buffers; pass the same dict on
+      every call to avoid allocating them again. If None, a new one is used.
+    - return_per_sample: If True, also return the data loss of every example.
+
+    Returns a tuple of:
+    - loss as single float
+    - gradient with respect to weights W; an array of same shape as W
+    - (only if return_per_sample) losses: array of shape (N,) with the
+      cross-entropy loss of each example, without regularization
+    """
+    if cache is None:
+        cache = {}
+    num_train = X.shape[0]
+    num_classes = W.shape[1]
+    dtype = np.result_type(X, W)
+    key = (num_train, W.shape, dtype)
+    if cache.get('key') != key:
+        cache['key'] = key
+        cache['scores'] = np.empty((num_train, num_classes), dtype=dtype)
+        cache['row_max'] = np.empty(num_train, dtype=dtype)
+        cache['row_sum'] = np.empty(num_train, dtype=dtype)
+        cache['losses'] = np.empty(num_train, dtype=dtype)
+        cache['flat_y'] = np.empty(num_train, dtype=np.intp)
+        cache['row_offsets'] = np.arange(num_train) * num_classes
+        cache['reg_grad'] = np.empty(W.shape, dtype=dtype)
+        cache['dW'] = np.empty(W.shape, dtype=dtype)
+    scores = cache['scores']
+    row_max = cache['row_max']
+    row_sum = cache['row_sum']
+    losses = cache['losses']
+    flat_y = cache['flat_y']
+    reg_grad = cache['reg_grad']
+    dW = cache['dW']
+
+    # Flat positions of the correct classes in scores.
+    np.add(cache['row_offsets'], y, out=flat_y)
+
+    np.dot(X, W, out=scores)
+    np.max(scores, axis=1, out=row_max)
+    scores -= row_max[:, np.newaxis]
+
+    # loss_i = log(sum_j exp(s_ij)) - s_iy, with the shifted scores.
+    np.take(scores, flat_y, out=losses)
+    np.exp(scores, out=scores)
+    np.sum(scores, axis=1, out=row_sum)
+    np.subtract(np.log(row_sum, out=row_max), losses, out=losses)
+    loss = np.sum(losses) / num_train + reg * np.vdot(W, W)
+
+    # Probabilities minus the one-hot labels, scaled by 1 / num_train.
+    scores /= row_sum[:, np.newaxis]
+    np.take(scores, flat_y, out=row_sum)
+    row_sum -= 1
+    np.put(scores, flat_y, row_sum)
+    scores *= 1.0 / num_train
+
+    np.dot(X.T, scores, out=dW)
+    np.multiply(W, reg, out=reg_grad)
+    dW += reg_grad
+
+    if return_per_sample:
+        return loss, dW, losses
+    return loss, dW
+
+
+def softmax_loss_bank(W, X, y, reg):
+    """
+    Softmax loss function for a bank of M linear models evaluated on the same
+    minibatch with a single matrix multiply.
+
+    Inputs and outputs are the same as svm_loss_bank.
+    """
+    num_train, dim = X.shape
+    num_models = reg.shape[0]
+    num_classes = W.shape[1] // num_models
+    rows = np.arange(num_train)
+
+    scores = X.dot(W).reshape(num_train, num_models, num_classes)
+    scores -= np.max(scores, axis=2, keepdims=True)
+    correct_class_scores = scores[rows, :, y]
+    np.exp(scores, out=scores)
+    row_sums = np.sum(scores, axis=2)
+    W_models = W.reshape(dim, num_models, num_classes)
+    reg = reg.astype(W.dtype, copy=False)
+    losses = (np.sum(np.log(row_sums) - correct_class_scores, axis=0) / num_train
+              + reg * np.sum(W_models * W_models, axis=(0, 2)))
+
+    scores /= row_sums[:, :, np.newaxis]
+    scores[rows, :, y] -= 1
+    dW = X.T.dot(scores.reshape(num_train, -1)) / num_train
+    dW += (W_models * reg[:, np.newaxis]).reshape(dim, -1)
+
+    return losses, dW
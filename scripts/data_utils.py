@@ -1,6 +1,7 @@
 from __future__ import print_function
 
 from builtins import range
+from builtins import object
 from six.moves import cPickle as pickle
 import numpy as np
 import os
@@ -15,42 +16,208 @@ def load_pickle(f):
         return  pickle.load(f, encoding='latin1')
     raise ValueError("invalid python version: {}".format(version))
 
-def load_CIFAR_batch(filename):
-    """ load single batch of cifar """
+def load_CIFAR_batch(filename, dtype=np.float64):
+    """ load single batch of cifar, converted to dtype """
     with open(filename, 'rb') as f:
         datadict = load_pickle(f)
         X = datadict['data']
         Y = datadict['labels']
-        X = X.reshape(10000, 3, 32, 32).transpose(0,2,3,1).astype("float")
+        # C order keeps images contiguous for minibatch gathers and np.save.
+        X = X.reshape(10000, 3, 32, 32).transpose(0,2,3,1).astype(dtype, order='C')
         Y = np.array(Y)
         return X, Y
 
-def load_CIFAR10(ROOT):
-    """ load all of cifar """
+def load_CIFAR10(ROOT, dtype=np.float64, cache=False, cache_dir=None):
+    """
+    load all of cifar, converted to dtype (None keeps the raw uint8 pixels).
+
+    With cache=True the batches are converted once by cache_CIFAR10 and later
+    calls load the uint8 cache instead of unpickling. With dtype=None the
+    images are then returned as read-only memory maps, so nothing is read
+    until it is used; convert minibatches to float as they are drawn, e.g.
+    X_train[idx].astype(np.float32).
+    """
+    if cache:
+        cache_dir = cache_CIFAR10(ROOT, cache_dir)
+        Xtr, Ytr, Xte, Yte = [
+            np.load(os.path.join(cache_dir, name), mmap_mode='r')
+            for name in CIFAR10_CACHE_FILES]
+        Ytr, Yte = np.array(Ytr), np.array(Yte)
+        if dtype is not None:
+            Xtr, Xte = Xtr.astype(dtype), Xte.astype(dtype)
+        return Xtr, Ytr, Xte, Yte
+
+    dtype = dtype or np.uint8
     xs = []
     ys = []
     for b in range(1,6):
         f = os.path.join(ROOT, 'data_batch_%d' % (b, ))
-        X, Y = load_CIFAR_batch(f)
+        X, Y = load_CIFAR_batch(f, dtype=dtype)
         xs.append(X)
         ys.append(Y)
     Xtr = np.concatenate(xs)
     Ytr = np.concatenate(ys)
     del X, Y
-    Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, 'test_batch'))
+    Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, 'test_batch'), dtype=dtype)
     return Xtr, Ytr, Xte, Yte
 
 
+CIFAR10_CACHE_FILES = ('X_train.npy', 'y_train.npy', 'X_test.npy', 'y_test.npy')
+
+
+def cache_CIFAR10(ROOT, cache_dir=None):
+    """
+    Convert the pickled CIFAR-10 batches to uint8 .npy files that
+    load_CIFAR10(..., cache=True) can memory-map. Does nothing if the cache
+    already exists. Every file is written under a temporary name and renamed
+    when complete, so an interrupted conversion is redone on the next call.
+
+    Inputs:
+    - ROOT: The cifar-10-batches-py directory.
+    - cache_dir: Directory of the cache; defaults to cifar-10-batches-npy
+      next to ROOT.
+
+    Returns the cache directory.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.normpath(ROOT)),
+                                 'cifar-10-batches-npy')
+    paths = [os.path.join(cache_dir, name) for name in CIFAR10_CACHE_FILES]
+    if all(os.path.exists(path) for path in paths):
+        return cache_dir
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    arrays = load_CIFAR10(ROOT, dtype=np.uint8)
+    for path, a in zip(paths, arrays):
+        tmp_path = path + '.tmp.npy'
+        np.save(tmp_path, a)
+        os.replace(tmp_path, path)
+    return cache_dir
+
+
+class BatchStream(object):
+    """
+    An iterable of (X_batch, y_batch) minibatches that are read from disk one
+    chunk at a time, so that training can start before, and without, the
+    whole dataset being loaded.
+
+    Every iteration over the stream is one pass (epoch) over the data. With
+    shuffle_buffer > 0 the chunks are read in a random order and the images
+    are shuffled within a window of about shuffle_buffer images plus one
+    chunk, which bounds the memory; the shuffle is different on every pass
+    and deterministic under the seed. The last batch of a pass may be
+    smaller than batch_size.
+
+    Example usage:
+
+    stream = stream_CIFAR10(cifar10_dir, batch_size=200, shuffle_buffer=10000)
+    for X_batch, y_batch in stream:
+        ...
+    """
+
+    def __init__(self, read_chunks, num_samples, num_classes, batch_size=200,
+                 shuffle_buffer=0, dtype=np.float64, transform=None, seed=None):
+        """
+        Inputs:
+        - read_chunks: Function that takes a RandomState and returns an
+          iterator over (X_chunk, y_chunk) arrays; it should visit the chunks
+          in a random order if shuffle_buffer > 0.
+        - num_samples: Number of images in one pass.
+        - num_classes: Number of classes.
+        - batch_size: Number of images per minibatch.
+        - shuffle_buffer: Number of images held back for shuffling; 0 yields
+          the images in the order they are read.
+        - dtype: numpy datatype of X_batch.
+        - transform: Optional function applied to every X_batch after the
+          cast, e.g. to subtract a mean image or to reshape.
+        - seed: Seed of the shuffle. If None, it is drawn from the global
+          np.random state.
+        """
+        self.read_chunks = read_chunks
+        self.num_samples = num_samples
+        self.num_classes = num_classes
+        self.batch_size = batch_size
+        self.shuffle_buffer = shuffle_buffer
+        self.dtype = dtype
+        self.transform = transform
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(seed)
+
+    def __len__(self):
+        """Number of minibatches in one pass."""
+        return -(-self.num_samples // self.batch_size)
+
+    def __iter__(self):
+        X_pool, y_pool = None, None
+        for X, y in self.read_chunks(self.rng):
+            if X_pool is None:
+                X_pool, y_pool = X, y
+            else:
+                X_pool = np.concatenate([X_pool, X])
+                y_pool = np.concatenate([y_pool, y])
+            if self.shuffle_buffer > 0:
+                perm = self.rng.permutation(len(y_pool))
+                X_pool, y_pool = X_pool[perm], y_pool[perm]
+            num_ready = len(y_pool) - self.shuffle_buffer
+            num_ready = max(0, num_ready // self.batch_size * self.batch_size)
+            for start in range(0, num_ready, self.batch_size):
+                yield self._batch(X_pool, y_pool, start)
+            X_pool, y_pool = X_pool[num_ready:], y_pool[num_ready:]
+        if X_pool is not None:
+            for start in range(0, len(y_pool), self.batch_size):
+                yield self._batch(X_pool, y_pool, start)
+
+    def _batch(self, X_pool, y_pool, start):
+        stop = start + self.batch_size
+        X_batch = X_pool[start:stop].astype(self.dtype)
+        if self.transform is not None:
+            X_batch = self.transform(X_batch)
+        return X_batch, np.array(y_pool[start:stop])
+
+
+def stream_CIFAR10(ROOT, batch_size=200, shuffle_buffer=0, train=True,
+                   dtype=np.float64, transform=None, seed=None):
+    """
+    Stream CIFAR-10 minibatches straight from the pickled batches, one batch
+    file of 10000 images in memory at a time; see BatchStream.
+
+    Inputs:
+    - ROOT: The cifar-10-batches-py directory.
+    - train: If True stream the five training batches, else the test batch.
+    - batch_size, shuffle_buffer, dtype, transform, seed: As for BatchStream.
+
+    Returns a BatchStream whose X_batch has shape (batch_size, 32, 32, 3), as
+    the images of load_CIFAR10.
+    """
+    if train:
+        names = ['data_batch_%d' % b for b in range(1, 6)]
+    else:
+        names = ['test_batch']
+
+    def read_chunks(rng):
+        order = range(len(names))
+        if shuffle_buffer > 0:
+            order = rng.permutation(len(names))
+        for i in order:
+            yield load_CIFAR_batch(os.path.join(ROOT, names[i]), dtype=np.uint8)
+
+    return BatchStream(read_chunks, 10000 * len(names), 10,
+                       batch_size=batch_size, shuffle_buffer=shuffle_buffer,
+                       dtype=dtype, transform=transform, seed=seed)
+
+
 def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000,
-                     subtract_mean=True):
+                     subtract_mean=True, dtype=np.float64):
     """
     Load the CIFAR-10 dataset from disk and perform preprocessing to prepare
     it for classifiers. These are the same steps as we used for the SVM, but
-    condensed to a single function.
+    condensed to a single function. The images are returned as dtype.
     """
     # Load the raw CIFAR-10 data
     cifar10_dir = 'cs231n/datasets/cifar-10-batches-py'
-    X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir)
+    X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir, dtype=dtype)
 
     # Subsample the data
     mask = list(range(num_training, num_training + num_validation))
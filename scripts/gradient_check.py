@@ -1,10 +1,14 @@
 from __future__ import print_function
 from builtins import range
 from past.builtins import xrange
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 from random import randrange
 
+from scripts.parallel import attach_array, release, share_array
+
 def eval_numerical_gradient(f, x, verbose=True, h=0.00001):
     """
     a naive implementation of numerical gradient of f at x
@@ -127,3 +131,198 @@ def grad_check_sparse(f, x, analytic_grad, num_checks=10, h=1e-5):
                     (abs(grad_numerical) + abs(grad_analytic)))
         print('numerical: %f analytic: %f, relative error: %e'
               %(grad_numerical, grad_analytic, rel_error))
+
+
+def eval_numerical_gradient_parallel(f, x, h=1e-5, indices=None, n_jobs=-1):
+    """
+    Centered difference gradient of f at x, like eval_numerical_gradient,
+    with the coordinates spread over a pool of worker processes.
+
+    Every worker maps x from shared memory once, keeps its own copy to
+    perturb, and evaluates a contiguous chunk of the coordinates, so x is
+    never modified in the caller.
+
+    Inputs:
+    - f: Function of a single array argument returning a scalar. With
+      n_jobs != 1 it must be picklable, e.g. a module level function or a
+      functools.partial of one, not a lambda.
+    - x: The point (numpy array) to evaluate the gradient at.
+    - h: Step size.
+    - indices: Optional array of flat indices into x; only these
+      coordinates are evaluated. Defaults to all of them.
+    - n_jobs: Number of worker processes; -1 uses all cores and 1 evaluates
+      in this process.
+
+    Returns an array of the shape of x if indices is None, and otherwise an
+    array with the partial derivative for every entry of indices.
+    """
+    if indices is None:
+        flat_indices = np.arange(x.size)
+    else:
+        flat_indices = np.asarray(indices, dtype=np.intp)
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    if n_jobs == 1:
+        x_copy = x.copy()
+        partials = _central_differences(f, x_copy, flat_indices, h)
+    else:
+        num_chunks = max(1, min(len(flat_indices), 4 * n_jobs))
+        chunks = np.array_split(flat_indices, num_chunks)
+        shm, spec = share_array(x)
+        try:
+            with ProcessPoolExecutor(n_jobs, initializer=_init_worker,
+                                     initargs=(f, spec)) as pool:
+                parts = pool.map(_central_differences_block, chunks,
+                                 [h] * len(chunks))
+                partials = np.concatenate(list(parts))
+        finally:
+            release(shm)
+
+    if indices is None:
+        return partials.reshape(x.shape)
+    return partials
+
+
+def grad_check_directional(f, x, analytic_grad, num_checks=10, h=1e-5,
+                           seed=None):
+    """
+    Check the analytic gradient along random directions that perturb every
+    coordinate at once (as in SPSA), so each check costs two evaluations of
+    f whatever the size of x.
+
+    For a random sign vector d the centered difference
+    (f(x + h * d) - f(x - h * d)) / (2 * h) is compared with the directional
+    derivative sum(analytic_grad * d). A wrong gradient anywhere in x shows
+    up with high probability, but a failing check does not say where; use
+    grad_check_sampled to locate it.
+
+    Inputs:
+    - f, x, analytic_grad, num_checks, h: As for grad_check_sparse.
+    - seed: Seed of the directions; if None they come from np.random.
+
+    Returns an array of the num_checks relative errors, and prints the same
+    report as grad_check_sparse.
+    """
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    rel_errors = np.zeros(num_checks)
+    oldval = x.copy()
+    for i in range(num_checks):
+        d = rng.randint(2, size=x.shape) * 2 - 1
+
+        x += h * d
+        fxph = f(x) # evaluate f(x + h * d)
+        x[...] = oldval - h * d
+        fxmh = f(x) # evaluate f(x - h * d)
+        x[...] = oldval # reset
+
+        grad_numerical = (fxph - fxmh) / (2 * h)
+        grad_analytic = np.sum(analytic_grad * d)
+        rel_errors[i] = _report(grad_numerical, grad_analytic)
+    return rel_errors
+
+
+def grad_check_sampled(f, x, analytic_grad, num_checks=30, h=1e-5,
+                       num_strata=3, confidence=0.95, n_jobs=1, seed=None):
+    """
+    Check the analytic gradient on a stratified sample of coordinates and
+    bound how much of x may have a larger relative error than any sample.
+
+    The coordinates are split into num_strata groups of equal size by the
+    magnitude of their analytic gradient, and num_checks coordinates are
+    drawn evenly from the groups. Unlike grad_check_sparse this makes sure
+    that the small gradients, where relative errors tend to be largest, and
+    the large ones are both checked.
+
+    If the n_s samples of stratum s all have a relative error of at most the
+    observed maximum, then with the given confidence (Bonferroni corrected
+    over the strata) the fraction of coordinates of that stratum above the
+    maximum is at most 1 - ((1 - confidence) / num_strata) ** (1 / n_s). A
+    stratum with no more coordinates than samples is checked exhaustively,
+    and its exact fraction, 0, is used instead. The bound reported is the
+    average of these fractions weighted by the stratum sizes, so a check of
+    every coordinate reports exactly 0.
+
+    Inputs:
+    - f, x, analytic_grad, num_checks, h: As for grad_check_sparse.
+    - num_strata: Number of strata.
+    - confidence: Confidence level of the bound.
+    - n_jobs: Worker processes for the evaluations, as for
+      eval_numerical_gradient_parallel.
+    - seed: Seed of the sample; if None it comes from np.random.
+
+    Returns a dictionary with keys:
+    - indices: The checked coordinates, as index tuples into x.
+    - rel_errors: Their relative errors.
+    - max_rel_error: The largest of them.
+    - exceed_fraction: Upper bound on the fraction of all coordinates whose
+      relative error is larger than max_rel_error.
+    """
+    rng = np.random if seed is None else np.random.RandomState(seed)
+    num_strata = max(1, min(num_strata, num_checks, x.size))
+    order = np.argsort(np.abs(analytic_grad).ravel(), kind='stable')
+    strata = np.array_split(order, num_strata)
+    counts = [len(c) for c in np.array_split(np.arange(num_checks), num_strata)]
+
+    flat_indices = np.concatenate(
+        [rng.choice(stratum, min(n, len(stratum)), replace=False)
+         for stratum, n in zip(strata, counts)])
+    grad_numerical = eval_numerical_gradient_parallel(
+        f, x, h=h, indices=flat_indices, n_jobs=n_jobs)
+    grad_analytic = analytic_grad.ravel()[flat_indices]
+    rel_errors = np.array([_report(num, ana) for num, ana
+                           in zip(grad_numerical, grad_analytic)])
+
+    alpha = (1 - confidence) / num_strata
+    exceed_fraction = 0.0
+    for stratum, n in zip(strata, counts):
+        if n >= len(stratum):
+            # Every coordinate was checked, so none is above the maximum.
+            continue
+        exceed_fraction += len(stratum) / x.size * (1 - alpha ** (1.0 / n))
+    max_rel_error = np.max(rel_errors)
+    print('max relative error: %e; with %d%% confidence at most %.1f%% of '
+          'the coordinates are above it'
+          % (max_rel_error, 100 * confidence, 100 * exceed_fraction))
+    return {
+        'indices': list(zip(*np.unravel_index(flat_indices, x.shape))),
+        'rel_errors': rel_errors,
+        'max_rel_error': max_rel_error,
+        'exceed_fraction': exceed_fraction,
+    }
+
+
+def _report(grad_numerical, grad_analytic):
+    denom = abs(grad_numerical) + abs(grad_analytic)
+    rel_error = abs(grad_numerical - grad_analytic) / denom if denom > 0 else 0.0
+    print('numerical: %f analytic: %f, relative error: %e'
+          %(grad_numerical, grad_analytic, rel_error))
+    return rel_error
+
+
+def _central_differences(f, x, flat_indices, h):
+    partials = np.zeros(len(flat_indices))
+    for i, flat_ix in enumerate(flat_indices):
+        ix = np.unravel_index(flat_ix, x.shape)
+        oldval = x[ix]
+        x[ix] = oldval + h
+        fxph = f(x)
+        x[ix] = oldval - h
+        fxmh = f(x)
+        x[ix] = oldval
+        partials[i] = (fxph - fxmh) / (2 * h)
+    return partials
+
+
+_worker = {}
+
+
+def _init_worker(f, spec):
+    shm, x = attach_array(spec)
+    _worker['f'] = f
+    _worker['x'] = x.copy()
+    shm.close()
+
+
+def _central_differences_block(flat_indices, h):
+    return _central_differences(_worker['f'], _worker['x'], flat_indices, h)
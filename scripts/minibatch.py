@@ -0,0 +1,99 @@
+from builtins import object
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class EpochBatcher(object):
+    """
+    Hands out minibatches by walking through a shuffled copy of the data.
+
+    Once per epoch the training set is permuted into a contiguous buffer, and
+    minibatches are then consecutive slices of that buffer, which are views
+    rather than fresh gathers. With prefetch enabled a background thread
+    fills a second buffer with the next epoch's permutation while the
+    current one is consumed, so the copy overlaps with training; this costs
+    one extra copy of the data in memory.
+
+    The last batch_size - 1 or fewer examples of each permutation are
+    skipped; they get their turn in later epochs.
+
+    Example usage:
+
+    batcher = EpochBatcher(X, y, batch_size=200)
+    for it in range(num_iters):
+        X_batch, y_batch = batcher.next_batch()
+        ...
+    batcher.close()
+    """
+
+    def __init__(self, X, y, batch_size, prefetch=None, seed=None):
+        """
+        Inputs:
+        - X: Array of shape (N, ...) of training data.
+        - y: Array of shape (N,) of training labels.
+        - batch_size: Number of examples per minibatch; clipped to N.
+        - prefetch: If True, shuffle the next epoch in a background thread.
+          If None, prefetch only when there is more than one core, since on
+          a single core the thread cannot overlap with training.
+        - seed: Seed of the permutations. If None, it is drawn from the global
+          np.random state, so np.random.seed still makes training repeatable.
+        """
+        self.X = X
+        self.y = y
+        self.num_train = X.shape[0]
+        self.batch_size = min(batch_size, self.num_train)
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.RandomState(seed)
+        self.epoch = 0
+        if prefetch is None:
+            prefetch = (os.cpu_count() or 1) > 1
+
+        num_buffers = 2 if prefetch else 1
+        self._buffers = [(np.empty_like(X), np.empty_like(y))
+                         for _ in range(num_buffers)]
+        self._fill = 0
+        self._pool = ThreadPoolExecutor(1) if prefetch else None
+        self._next = None
+        self._start_epoch()
+
+    def next_batch(self):
+        """
+        Return the next minibatch as a tuple (X_batch, y_batch) of views into
+        the current epoch buffer. Their contents are only valid until the
+        next epoch starts, because the buffer is then refilled.
+        """
+        if self._pos + self.batch_size > self.num_train:
+            self.epoch += 1
+            self._start_epoch()
+        start, stop = self._pos, self._pos + self.batch_size
+        self._pos = stop
+        return self._X_epoch[start:stop], self._y_epoch[start:stop]
+
+    def close(self):
+        """Stop the background thread."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _start_epoch(self):
+        if self._pool is None:
+            self._X_epoch, self._y_epoch = self._shuffle()
+        else:
+            if self._next is None:
+                self._next = self._pool.submit(self._shuffle)
+            self._X_epoch, self._y_epoch = self._next.result()
+            self._next = self._pool.submit(self._shuffle)
+        self._pos = 0
+
+    def _shuffle(self):
+        X_buf, y_buf = self._buffers[self._fill]
+        self._fill = (self._fill + 1) % len(self._buffers)
+        perm = self.rng.permutation(self.num_train)
+        # With out= and the default mode='raise' np.take copies through an
+        # extra buffer; perm is a valid permutation, so 'clip' is safe.
+        np.take(self.X, perm, axis=0, out=X_buf, mode='clip')
+        np.take(self.y, perm, out=y_buf, mode='clip')
+        return X_buf, y_buf
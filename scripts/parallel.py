@@ -0,0 +1,40 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def share_array(a):
+    """
+    Copy an array into a new block of shared memory so that worker processes
+    can map it instead of receiving a pickled copy.
+
+    Inputs:
+    - a: A numpy array.
+
+    Returns a tuple of:
+    - shm: The SharedMemory block; the caller must close() and unlink() it
+      once the workers are done.
+    - spec: A small picklable description of the array to pass to the
+      workers, which turn it back into an array with attach_array.
+    """
+    a = np.ascontiguousarray(a)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+    np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+    return shm, (shm.name, a.shape, a.dtype.str)
+
+
+def attach_array(spec):
+    """
+    Map an array shared with share_array in a worker process.
+
+    Returns a tuple (shm, a); keep shm referenced for as long as a is used.
+    """
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def release(shm):
+    """Close and unlink a block created by share_array."""
+    shm.close()
+    shm.unlink()